@@ -0,0 +1,217 @@
+# analysis.py
+"""
+Sensitivity and break-even analysis for one quote.
+
+The quote is priced as calculate_cost does, but over NumPy arrays: one
+batch holds the quote plus a nudged copy either side of each numeric input,
+so every partial derivative comes out of a single evaluation.
+
+Usage:
+    python analysis.py ESTIMATE_ID [--alt screen_cost=0.8 ...]
+"""
+import argparse
+
+import numpy as np
+
+import costing
+import database
+import revisions
+from quote import card_rates
+
+# A per_order cost "stops mattering" once it is below this share of the unit price
+NEGLIGIBLE_SHARE = 0.01
+
+_COST_FIELDS = tuple(cost for cost, _ in costing.ADD_ON_COSTS)
+_STEP = 1e-6
+
+
+def price(cols: dict, per_order: dict, is_card: bool):
+    """
+    (cost per piece, grand total) arrays for columns of quote inputs.
+    per_order maps each add-on cost to True if it is charged per order.
+    """
+    if is_card:
+        per_piece = card_rates(*(cols[name] for name in costing.CARD_INPUT_FIELDS))
+    else:
+        per_piece = cols["card_calc_cost_per_piece"].copy()
+    order_sum = np.zeros_like(per_piece)
+    for cost in _COST_FIELDS:
+        if per_order[cost]:
+            order_sum = order_sum + cols[cost]
+        else:
+            per_piece = per_piece + cols[cost]
+    return per_piece, per_piece * cols["quantity"] + order_sum
+
+
+def _spec(q):
+    source = {name: q[name] for name in ("quantity",) + _COST_FIELDS}
+    is_card = q["material"] == "Card & Board"
+    if is_card:
+        inputs = costing.card_inputs(q)
+        if inputs is None:
+            # Only the stored rate is known
+            is_card = False
+        else:
+            source.update(inputs)
+    names = ("quantity",) + (costing.CARD_INPUT_FIELDS if is_card else ()) + _COST_FIELDS
+    values = np.array([float(source[name] or 0) for name in names])
+    per_order = {cost: q[type_field] == "per_order" for cost, type_field in costing.ADD_ON_COSTS}
+    return names, values, per_order, is_card
+
+
+def sensitivities(q) -> list:
+    """
+    For each numeric input of a quote (a Quote or mapping): its value, the
+    partial derivatives of cost per piece and grand total, and their
+    elasticities (% change in the output per 1% change in the input).
+    Sorted by how strongly the input drives the grand total.
+    """
+    names, values, per_order, is_card = _spec(q)
+    k = len(names)
+    steps = _STEP * np.maximum(np.abs(values), 1.0)
+
+    # Row 0 is the quote; rows 1..k nudge one input up, rows k+1..2k down
+    batch = np.tile(values, (2 * k + 1, 1))
+    idx = np.arange(k)
+    batch[1 + idx, idx] += steps
+    batch[1 + k + idx, idx] -= steps
+    cols = {name: batch[:, j] for j, name in enumerate(names)}
+    cols["card_calc_cost_per_piece"] = np.full(2 * k + 1, float(q["card_calc_cost_per_piece"] or 0))
+
+    per_piece, total = price(cols, per_order, is_card)
+    d_piece = (per_piece[1:k + 1] - per_piece[k + 1:]) / (2 * steps)
+    d_total = (total[1:k + 1] - total[k + 1:]) / (2 * steps)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        e_piece = np.where(per_piece[0] != 0, d_piece * values / per_piece[0], 0.0)
+        e_total = np.where(total[0] != 0, d_total * values / total[0], 0.0)
+
+    rows = [{
+        "input": name,
+        "value": values[j],
+        "d_per_piece": d_piece[j],
+        "d_total": d_total[j],
+        "elasticity_per_piece": e_piece[j],
+        "elasticity_total": e_total[j],
+    } for j, name in enumerate(names)]
+    rows.sort(key=lambda r: -abs(r["elasticity_total"]))
+    return rows
+
+
+def break_even_quantity(per_order_amount, per_piece_rate):
+    """
+    Quantity at which a flat per_order amount and a per_piece rate cost the
+    same: below it per_piece is cheaper, above it per_order. Arrays allowed;
+    inf where the rate is zero.
+    """
+    per_order_amount = np.asarray(per_order_amount, dtype=np.float64)
+    per_piece_rate = np.asarray(per_piece_rate, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(per_piece_rate > 0, per_order_amount / per_piece_rate, np.inf)
+
+
+def add_on_break_even(q, alternatives: dict = None, share: float = NEGLIGIBLE_SHARE) -> list:
+    """
+    For each non-zero add-on of a quote: what it comes to per piece and per
+    order at the quoted quantity, its share of the unit price (grand total /
+    quantity), and for per_order costs the quantity above which that share
+    drops below `share`.
+    alternatives maps a cost field to its price under the other type (e.g.
+    a per_piece rate for a cost quoted per_order); for those the break-even
+    quantity between the two is given too.
+    """
+    alternatives = alternatives or {}
+    names, values, per_order, is_card = _spec(q)
+    cols = {name: values[j:j + 1] for j, name in enumerate(names)}
+    cols["card_calc_cost_per_piece"] = np.array([float(q["card_calc_cost_per_piece"] or 0)])
+    per_piece, total = (a[0] for a in price(cols, per_order, is_card))
+    qty = cols["quantity"][0]
+
+    costs = [c for c in _COST_FIELDS if float(q[c] or 0) != 0 or c in alternatives]
+    amount = np.array([float(q[c] or 0) for c in costs])
+    is_order = np.array([per_order[c] for c in costs], dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        each = np.where(is_order, amount / qty, amount)
+        whole = np.where(is_order, amount, amount * qty)
+        unit_price = total / qty if qty else np.nan
+        shares = each / unit_price
+
+        # amount/Q <= share * (per_piece + order_sum/Q)  <=>  Q >= (amount - share*order_sum) / (share*per_piece)
+        order_sum = total - per_piece * qty
+        need = amount - share * order_sum
+        negligible_at = np.where(need <= 0, 0.0,
+                                 np.where(per_piece > 0, need / (share * per_piece), np.inf))
+    negligible_at = np.where(is_order, np.ceil(negligible_at), np.nan)
+
+    alt = np.array([alternatives.get(c, np.nan) for c in costs], dtype=np.float64)
+    be = break_even_quantity(np.where(is_order, amount, alt), np.where(is_order, alt, amount))
+    be = np.where(np.isnan(alt), np.nan, be)
+
+    return [{
+        "cost": c,
+        "type": "per_order" if is_order[j] else "per_piece",
+        "amount": amount[j],
+        "per_piece": each[j],
+        "per_order": whole[j],
+        "share": shares[j],
+        "negligible_above": negligible_at[j],
+        "alternative": alt[j],
+        "break_even_qty": be[j],
+    } for j, c in enumerate(costs)]
+
+
+def _label(name: str) -> str:
+    return name.replace("_cost", "").replace("_", " ")
+
+
+def format_analysis(q, alternatives: dict = None) -> str:
+    """
+    Sensitivities and add-on break-evens as text for the result panel.
+    """
+    lines = ["---- Sensitivity (what drives the price) ----",
+             f"{'Input':<16}{'Value':>12}{'d Cost/pc':>14}{'d Total':>14}{'% Total per 1%':>16}"]
+    for r in sensitivities(q):
+        # Inputs that don't move the price, and add-ons not in the quote
+        if (r["d_total"] == 0 and r["d_per_piece"] == 0) or (r["input"] in _COST_FIELDS and r["value"] == 0):
+            continue
+        lines.append(f"{_label(r['input']):<16}{r['value']:>12,.6g}{r['d_per_piece']:>14.6g}"
+                     f"{r['d_total']:>14.6g}{r['elasticity_total'] * 100:>15.2f}%")
+
+    rows = add_on_break_even(q, alternatives)
+    if rows:
+        lines.append("")
+        lines.append(f"---- Add-ons at {q['quantity']} pcs ----")
+        lines.append(f"{'Add-on':<16}{'Type':>10}{'Per pc':>12}{'Per order':>14}{'Share':>9}"
+                     f"{'<' + format(NEGLIGIBLE_SHARE, '.0%') + ' above':>14}")
+        for r in rows:
+            above = "-" if np.isnan(r["negligible_above"]) else (
+                "never" if np.isinf(r["negligible_above"]) else f"{r['negligible_above']:,.0f} pcs")
+            lines.append(f"{_label(r['cost']):<16}{r['type']:>10}{r['per_piece']:>12.4f}"
+                         f"{r['per_order']:>14,.2f}{r['share']:>9.1%}{above:>14}")
+            if not np.isnan(r["break_even_qty"]):
+                other = "per_piece" if r["type"] == "per_order" else "per_order"
+                lines.append(f"    vs {other} {r['alternative']:g}: break-even at {r['break_even_qty']:,.0f} pcs "
+                             f"(per_order is cheaper above it)")
+    return "\n".join(lines)
+
+
+def _alternative(text: str):
+    cost, _, value = text.partition("=")
+    if cost not in _COST_FIELDS:
+        raise argparse.ArgumentTypeError(f"unknown add-on '{cost}'")
+    return cost, float(value)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sensitivity and break-even analysis of a saved estimate.")
+    parser.add_argument("estimate_id", type=int)
+    parser.add_argument("--revision", type=int, help="analyse this revision instead of the latest")
+    parser.add_argument("--alt", type=_alternative, action="append", default=[],
+                        metavar="COST=PRICE", help="price of an add-on under its other type")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    print(format_analysis(revisions.get_revision(args.estimate_id, args.revision), dict(args.alt)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# archive.py
+"""
+Hot/cold archival of old estimates.
+
+Estimates created before a cutoff move out of cost_estimator.db into one
+SQLite file per year (archive/cost_estimator_<year>.db), so the hot table
+and its indexes stay small. History queries (iter_history) read the
+years they need one file at a time, then the hot database.
+
+Usage:
+    python archive.py --before 2024-01-01 [--batch-size 5000] [--vacuum]
+"""
+import argparse
+import glob
+import os
+import pathlib
+import re
+import sqlite3
+
+import database
+import writer
+
+BATCH_SIZE = 5000
+
+
+def archive_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(database.DB_NAME)), "archive")
+
+
+def archive_path(year: int) -> str:
+    return os.path.join(archive_dir(), f"cost_estimator_{year}.db")
+
+
+def archive_years() -> list:
+    """
+    Years that have an archive file, oldest first.
+    """
+    years = []
+    for path in glob.glob(os.path.join(archive_dir(), "cost_estimator_*.db")):
+        m = re.search(r"_(\d{4})\.db$", path)
+        if m:
+            years.append(int(m.group(1)))
+    return sorted(years)
+
+
+def _columns(conn) -> str:
+    return ", ".join(row[1] for row in conn.execute("PRAGMA main.table_info(cost_estimates)"))
+
+
+def archive_before(cutoff: str, batch_size: int = BATCH_SIZE) -> dict:
+    """
+    Move every estimate with created_at < cutoff ("YYYY-MM-DD") into its
+    year's archive file, batch_size rows per transaction.
+    Rows without a created_at (saved before it existed) stay hot.
+    Returns {year: rows moved}.
+    """
+    os.makedirs(archive_dir(), exist_ok=True)
+    # ATTACH can't run inside a transaction, so this is a job on the writer
+    # connection rather than a group
+    return writer.run_job(lambda conn: _archive(conn, cutoff, batch_size))
+
+
+def _archive(conn, cutoff: str, batch_size: int) -> dict:
+    cols = _columns(conn)
+    moved = {}
+    years = [int(r[0]) for r in conn.execute(
+        "SELECT DISTINCT substr(created_at, 1, 4) FROM cost_estimates "
+        "WHERE created_at IS NOT NULL AND created_at < ? ORDER BY 1", (cutoff,)
+    )]
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+
+    for year in years:
+        conn.execute("ATTACH DATABASE ? AS arc", (archive_path(year),))
+        try:
+            database.create_estimates_table(conn.cursor(), "arc")
+            conn.execute("CREATE INDEX IF NOT EXISTS arc.idx_cost_estimates_client ON cost_estimates(client_name)")
+            conn.execute("CREATE INDEX IF NOT EXISTS arc.idx_cost_estimates_created ON cost_estimates(created_at)")
+
+            # In WAL mode a commit spanning two files is atomic per file
+            # only; finish any batch an interrupted run copied but didn't delete
+            conn.execute("DELETE FROM main.cost_estimates WHERE id IN (SELECT id FROM arc.cost_estimates)")
+
+            year_end = min(cutoff, f"{year + 1}-01-01")
+            moved[year] = 0
+            while True:
+                writer.begin(conn)
+                conn.execute("DELETE FROM temp.archive_batch")
+                conn.execute('''
+                    INSERT INTO temp.archive_batch
+                    SELECT id FROM main.cost_estimates
+                    WHERE created_at >= ? AND created_at < ?
+                    ORDER BY created_at LIMIT ?
+                ''', (f"{year}-01-01", year_end, batch_size))
+                n = conn.execute("SELECT COUNT(*) FROM temp.archive_batch").fetchone()[0]
+                if not n:
+                    conn.execute("COMMIT")
+                    break
+                conn.execute(f'''
+                    INSERT OR REPLACE INTO arc.cost_estimates ({cols})
+                    SELECT {cols} FROM main.cost_estimates
+                    WHERE id IN (SELECT id FROM temp.archive_batch)
+                ''')
+                conn.execute("DELETE FROM main.cost_estimates WHERE id IN (SELECT id FROM temp.archive_batch)")
+                conn.execute("COMMIT")
+                moved[year] += n
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute("DETACH DATABASE arc")
+    return moved
+
+
+def open_year(year: int):
+    """
+    Read-only connection to one year's archive file.
+    """
+    uri = pathlib.Path(archive_path(year)).as_uri() + "?mode=ro"
+    return sqlite3.connect(uri, uri=True, timeout=database.BUSY_TIMEOUT)
+
+
+def iter_history(conn, sql: str, params=(), since: str = None, until: str = None, row_factory=None):
+    """
+    Run sql, a query on cost_estimates, against each archive year
+    overlapping [since, until), oldest first, then against the hot database
+    on conn (skipped if conn is None), and yield every row.
+    Years are opened one at a time rather than ATTACHed together, so there
+    is no limit on how many can be read; an aggregate comes back once per
+    file and the caller combines them.
+    """
+    first = int(since[:4]) if since else None
+    last = int(until[:4]) if until else None
+    for year in archive_years():
+        if (first is not None and year < first) or (last is not None and year > last):
+            continue
+        arc = open_year(year)
+        try:
+            arc.row_factory = row_factory or (conn.row_factory if conn is not None else None)
+            yield from arc.execute(sql, params)
+        finally:
+            arc.close()
+    if conn is not None:
+        cursor = conn.cursor()
+        if row_factory is not None:
+            cursor.row_factory = row_factory
+        yield from cursor.execute(sql, params)
+
+
+def estimate_history(client_name: str = None, since: str = None, until: str = None) -> list:
+    """
+    Estimates created in [since, until), optionally for one client, from hot
+    and archived data alike, oldest first.
+    """
+    where, params = [], []
+    if client_name is not None:
+        where.append("client_name = ?")
+        params.append(client_name)
+    if since:
+        where.append("created_at >= ?")
+        params.append(since)
+    if until:
+        where.append("created_at < ?")
+        params.append(until)
+    sql = "SELECT * FROM cost_estimates"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+
+    conn = database.get_read_connection()
+    try:
+        rows = list(iter_history(conn, sql, params, since, until, sqlite3.Row))
+    finally:
+        conn.close()
+    return sorted(rows, key=lambda r: (r["created_at"] or "", r["id"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move old estimates into yearly archive databases.")
+    parser.add_argument("--before", required=True, help="archive estimates created before this date (YYYY-MM-DD)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--vacuum", action="store_true", help="compact cost_estimator.db afterwards")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    moved = archive_before(args.before, args.batch_size)
+    for year, n in moved.items():
+        print(f"{year}: {n} estimates -> {archive_path(year)}")
+    if not moved:
+        print("Nothing to archive.")
+
+    if args.vacuum:
+        conn = database.get_connection()
+        conn.execute("VACUUM")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# backup.py
+"""
+Online backups of cost_estimator.db and its archive years.
+
+Snapshots are taken with SQLite's backup API a few pages at a time, so the
+app keeps saving estimates while a backup runs. Each snapshot gets a
+.sha256 file next to it, and the archive years (see archive.py) are copied
+into <snapshot>.archive/ with their own; the newest KEEP sets are kept.
+
+Usage:
+    python backup.py                  # take one snapshot now
+    python backup.py --every 3600     # keep taking one every hour
+    python backup.py --list
+    python backup.py --restore latest # or a snapshot path
+"""
+import argparse
+import glob
+import hashlib
+import logging
+import os
+import pathlib
+import shutil
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import archive
+import database
+
+KEEP = 7
+PAGES_PER_STEP = 256
+STEP_SLEEP = 0.005
+# A step-wise copy starts over whenever another connection writes; after
+# this many restarts the rest is copied in one step from a WAL snapshot
+MAX_RESTARTS = 5
+
+log = logging.getLogger(__name__)
+
+
+def backup_dir() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(database.DB_NAME)), "backups")
+
+
+def list_snapshots() -> list:
+    """
+    Snapshot paths, oldest first.
+    """
+    return sorted(glob.glob(os.path.join(backup_dir(), "cost_estimator_*.db")))
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def _copy(src, dst, pages: int, sleep: float) -> int:
+    """
+    Run the backup API from src into dst. Returns the number of restarts.
+    """
+    state = {"remaining": None, "restarts": 0}
+
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            state["restarts"] += 1
+            if state["restarts"] > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        state["remaining"] = remaining
+
+    try:
+        src.backup(dst, pages=pages, progress=progress, sleep=sleep)
+    except _TooManyRestarts:
+        # In WAL mode a single step only holds a read snapshot; writers carry on
+        src.backup(dst, pages=-1)
+    return state["restarts"]
+
+
+def archive_copies(snapshot: str) -> list:
+    """
+    The archive-year files saved with a snapshot, oldest year first.
+    """
+    return sorted(glob.glob(os.path.join(snapshot + ".archive", "cost_estimator_*.db")))
+
+
+def _snapshot_file(src, path: str, pages: int, sleep: float) -> tuple:
+    """
+    Copy the database open on src to path, check it and write path.sha256.
+    Returns (restarts, checksum).
+    """
+    tmp_path = path + ".part"
+    try:
+        dst = sqlite3.connect(tmp_path)
+        try:
+            restarts = _copy(src, dst, pages, sleep)
+            # The snapshot is a standalone file, not a WAL database
+            dst.execute("PRAGMA journal_mode=DELETE")
+            ok = dst.execute("PRAGMA quick_check").fetchone()[0]
+        finally:
+            dst.close()
+        if ok != "ok":
+            raise sqlite3.DatabaseError(f"Snapshot of {os.path.basename(path)} failed quick_check: {ok}")
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Nothing else ever looks at .part files, so a failed or interrupted
+        # copy must not leave one behind
+        for name in (tmp_path, tmp_path + "-journal"):
+            if os.path.exists(name):
+                os.remove(name)
+        raise
+    checksum = file_sha256(path)
+    with open(path + ".sha256", "w") as f:
+        f.write(f"{checksum}  {os.path.basename(path)}\n")
+    return restarts, checksum
+
+
+def _remove_snapshot(path: str):
+    for name in (path, path + ".sha256"):
+        if os.path.exists(name):
+            os.remove(name)
+    shutil.rmtree(path + ".archive", ignore_errors=True)
+
+
+def backup_now(keep: int = KEEP, pages: int = PAGES_PER_STEP, sleep: float = STEP_SLEEP) -> dict:
+    """
+    Take one snapshot of cost_estimator.db and of every archive year (in
+    <snapshot>.archive/), write their checksums and drop snapshots beyond
+    `keep`. Returns the path, checksum, size of the set, archive years,
+    duration and throughput.
+    """
+    os.makedirs(backup_dir(), exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    path = os.path.join(backup_dir(), f"cost_estimator_{stamp}.db")
+
+    start = time.perf_counter()
+    try:
+        src = database.get_connection()
+        try:
+            restarts, checksum = _snapshot_file(src, path, pages, sleep)
+        finally:
+            src.close()
+
+        years = archive.archive_years()
+        if years:
+            os.makedirs(path + ".archive")
+        for year in years:
+            src = sqlite3.connect(archive.archive_path(year), timeout=database.BUSY_TIMEOUT)
+            try:
+                dst_path = os.path.join(path + ".archive", os.path.basename(archive.archive_path(year)))
+                restarts += _snapshot_file(src, dst_path, pages, sleep)[0]
+            finally:
+                src.close()
+    except BaseException:
+        # A set missing an archive year is no use for restore
+        _remove_snapshot(path)
+        raise
+    elapsed = time.perf_counter() - start
+
+    for old in list_snapshots()[:-keep] if keep else []:
+        _remove_snapshot(old)
+
+    size = os.path.getsize(path) + sum(os.path.getsize(p) for p in archive_copies(path))
+    return {
+        "path": path,
+        "sha256": checksum,
+        "bytes": size,
+        "archive_years": years,
+        "seconds": elapsed,
+        "mb_per_s": size / 1e6 / elapsed if elapsed else 0.0,
+        "restarts": restarts,
+    }
+
+
+def _verify_file(path: str) -> bool:
+    try:
+        with open(path + ".sha256") as f:
+            expected = f.read().split()[0]
+    except (OSError, IndexError):
+        return False
+    return file_sha256(path) == expected
+
+
+def verify(path: str) -> bool:
+    """
+    True if the snapshot and every archive year saved with it match their
+    recorded checksums.
+    """
+    return _verify_file(path) and all(_verify_file(p) for p in archive_copies(path))
+
+
+def _restore_file(snapshot: str, target: str):
+    # Copying through the backup API takes the proper locks and leaves any
+    # WAL in a consistent state, unlike overwriting the file
+    src = sqlite3.connect(pathlib.Path(snapshot).resolve().as_uri() + "?mode=ro", uri=True)
+    dst = sqlite3.connect(target, timeout=database.BUSY_TIMEOUT)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def restore(snapshot: str = "latest") -> str:
+    """
+    Replace the contents of cost_estimator.db and the archive years with a
+    verified snapshot set; archive years the snapshot doesn't have are
+    removed. The current files are snapshotted first (and kept) in case the
+    restore was a mistake. Returns the snapshot restored.
+    """
+    if snapshot == "latest":
+        snapshots = list_snapshots()
+        if not snapshots:
+            raise FileNotFoundError(f"No snapshots in {backup_dir()}")
+        snapshot = snapshots[-1]
+    if not verify(snapshot):
+        raise ValueError(f"Checksum mismatch or missing .sha256 for {snapshot}")
+
+    if os.path.exists(database.DB_NAME):
+        backup_now(keep=0)
+
+    _restore_file(snapshot, database.DB_NAME)
+    copies = {os.path.basename(p): p for p in archive_copies(snapshot)}
+    if copies:
+        os.makedirs(archive.archive_dir(), exist_ok=True)
+    for year in archive.archive_years():
+        if os.path.basename(archive.archive_path(year)) not in copies:
+            os.remove(archive.archive_path(year))
+    for name, path in copies.items():
+        _restore_file(path, os.path.join(archive.archive_dir(), name))
+    database.init_db()
+    return snapshot
+
+
+class BackupScheduler:
+    """
+    Background thread that takes a snapshot every `interval` seconds.
+    """
+    def __init__(self, interval: float, keep: int = KEEP, on_done=None):
+        self.interval = interval
+        self.keep = keep
+        self.on_done = on_done
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="db-backup", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                report = backup_now(self.keep)
+            except Exception as e:
+                report = {"error": str(e)}
+            if self.on_done is not None:
+                self.on_done(report)
+
+
+def describe(report) -> str:
+    """
+    One line for a backup_now() report (or a scheduler failure).
+    """
+    if "error" in report:
+        return f"Backup failed: {report['error']}"
+    archives = f", {len(report['archive_years'])} archive years" if report["archive_years"] else ""
+    return (f"{report['path']}  {report['bytes'] / 1e6:.1f} MB{archives} in {report['seconds']:.2f}s "
+            f"({report['mb_per_s']:.1f} MB/s, {report['restarts']} restarts)  sha256={report['sha256'][:16]}")
+
+
+def log_report(report):
+    """
+    on_done for a BackupScheduler inside the app: failures are logged as
+    errors, durations and throughput as info.
+    """
+    if "error" in report:
+        log.error(describe(report))
+    else:
+        log.info(describe(report))
+
+
+def _print_report(report):
+    print(describe(report))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Back up or restore cost_estimator.db.")
+    parser.add_argument("--every", type=float, help="keep running, one snapshot every N seconds")
+    parser.add_argument("--keep", type=int, default=KEEP, help="snapshots to keep")
+    parser.add_argument("--list", action="store_true", help="list snapshots and check their checksums")
+    parser.add_argument("--restore", metavar="SNAPSHOT", help="'latest' or a snapshot path")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for path in list_snapshots():
+            print(f"{path}  {'ok' if verify(path) else 'CHECKSUM MISMATCH'}")
+    elif args.restore:
+        print(f"Restored {restore(args.restore)}")
+    elif args.every:
+        scheduler = BackupScheduler(args.every, args.keep, _print_report).start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    else:
+        _print_report(backup_now(args.keep))
+
+
+if __name__ == "__main__":
+    main()
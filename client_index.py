@@ -0,0 +1,201 @@
+# client_index.py
+"""
+In-memory prefix index over client names, used by the Client autocomplete.
+
+Every trie node keeps its own short, sorted list of completions, so a prefix
+lookup is a walk of len(prefix) nodes with no subtree scan. A branch that
+only one name uses is kept as a single leaf node holding that name, and is
+split a level at a time when a second name shares it. When nothing starts
+with the typed text, the same trie is walked again with a small edit budget
+to suggest near spellings instead.
+"""
+from bisect import insort
+
+MAX_SUGGESTIONS = 10
+
+
+def normalize(name: str) -> str:
+    """
+    Key used for matching: case-folded, with runs of whitespace collapsed.
+    """
+    return " ".join(name.split()).casefold()
+
+
+class _Node:
+    __slots__ = ("children", "top")
+
+    def __init__(self, entry=None):
+        self.children = {}
+        # Up to MAX_SUGGESTIONS (key, display name) pairs below this node, sorted.
+        # A node with no children holds exactly one name.
+        self.top = [entry] if entry else []
+
+
+class ClientIndex:
+    """
+    Prefix trie of distinct client names. The first spelling seen for a
+    normalized key is the one suggested.
+    """
+    def __init__(self, names=(), limit: int = MAX_SUGGESTIONS):
+        self.limit = limit
+        self._root = _Node()
+        self._names = {}
+        # Sorted input means each node's list fills in order and then stops changing
+        for name in sorted(names, key=lambda n: normalize(n or "")):
+            self.add(name)
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return normalize(name) in self._names
+
+    def add(self, name: str):
+        """
+        Add one client name. Cheap enough to call on every save.
+        """
+        key = normalize(name or "")
+        if not key or key in self._names:
+            return
+        display = name.strip()
+        self._names[key] = display
+
+        entry = (key, display)
+        node = self._root
+        self._offer(node, entry)
+        for depth, ch in enumerate(key, 1):
+            child = node.children.get(ch)
+            if child is None:
+                node.children[ch] = _Node(entry)
+                return
+            if not child.children:
+                # A single-name leaf: push its name one level down before sharing it
+                leaf_key = child.top[0][0]
+                if len(leaf_key) > depth:
+                    child.children[leaf_key[depth]] = _Node(child.top[0])
+            self._offer(child, entry)
+            node = child
+
+    def _offer(self, node, entry):
+        top = node.top
+        if len(top) < self.limit:
+            if not top or entry > top[-1]:
+                top.append(entry)
+            else:
+                insort(top, entry)
+        elif entry < top[-1]:
+            insort(top, entry)
+            top.pop()
+
+    def suggest(self, text: str, limit: int = None):
+        """
+        Names starting with `text`; if there are none, the closest spellings.
+        """
+        limit = limit or self.limit
+        key = normalize(text or "")
+        if not key:
+            return []
+
+        node = self._root
+        for ch in key:
+            if not node.children and node is not self._root:
+                # Reached a single-name leaf; it either continues the text or not
+                if node.top[0][0].startswith(key):
+                    return [node.top[0][1]]
+                return self.fuzzy(key, limit)
+            node = node.children.get(ch)
+            if node is None:
+                return self.fuzzy(key, limit)
+        return [display for _, display in node.top[:limit]]
+
+    def fuzzy(self, text: str, limit: int = None):
+        """
+        Names whose prefix is one edit away from `text` (a missing, extra,
+        wrong or swapped character), or two edits for text of six characters
+        or more when one edit finds nothing.
+        """
+        limit = limit or self.limit
+        key = normalize(text or "")
+        if not key:
+            return []
+
+        found = {}
+        for budget in ((1, 2) if len(key) >= 6 else (1,)):
+            self._walk(self._root, 0, key, 0, budget, 0, found)
+            if found:
+                break
+
+        ranked = sorted(found.items(), key=lambda item: (item[1], item[0]))
+        return [display for (_, display), _ in ranked[:limit]]
+
+    def _walk(self, node, depth, key, i, budget, spent, found):
+        """
+        Follow key[i:] down from node (depth chars into the trie), spending at
+        most `budget` edits. Every name reached is recorded with its cost.
+        """
+        if not node.children and node is not self._root:
+            # Single-name leaf: finish the comparison against the name itself
+            entry = node.top[0]
+            dist = _prefix_distance(key[i:], entry[0][depth:], budget)
+            if dist is not None:
+                _record(found, entry, spent + dist)
+            return
+
+        if i == len(key):
+            for entry in node.top:
+                _record(found, entry, spent)
+            return
+
+        ch = key[i]
+        child = node.children.get(ch)
+        if child is not None:
+            self._walk(child, depth + 1, key, i + 1, budget, spent, found)
+        if not budget:
+            return
+
+        # Extra character typed
+        self._walk(node, depth, key, i + 1, budget - 1, spent + 1, found)
+        for c, child in node.children.items():
+            # Character missing
+            self._walk(child, depth + 1, key, i, budget - 1, spent + 1, found)
+            # Wrong character
+            if c != ch:
+                self._walk(child, depth + 1, key, i + 1, budget - 1, spent + 1, found)
+        # Two characters swapped
+        if i + 1 < len(key) and key[i + 1] != ch:
+            child = node.children.get(key[i + 1])
+            grandchild = child.children.get(ch) if child is not None else None
+            if grandchild is not None:
+                self._walk(grandchild, depth + 2, key, i + 2, budget - 1, spent + 1, found)
+
+
+def _record(found, entry, dist):
+    if dist < found.get(entry, dist + 1):
+        found[entry] = dist
+
+
+def _prefix_distance(text, name, max_dist):
+    """
+    Smallest edit distance between `text` and any prefix of `name`,
+    or None if it is over max_dist.
+    """
+    n = len(text)
+    prev = list(range(n + 1))
+    best = prev[-1]
+    for c in name[:n + max_dist]:
+        left = prev[0] + 1
+        row = [left]
+        for j in range(n):
+            val = prev[j] if text[j] == c else prev[j] + 1
+            if prev[j + 1] + 1 < val:
+                val = prev[j + 1] + 1
+            if left + 1 < val:
+                val = left + 1
+            row.append(val)
+            left = val
+        if left < best:
+            best = left
+        if min(row) > max_dist:
+            break
+        prev = row
+    return best if best <= max_dist else None
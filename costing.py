@@ -0,0 +1,146 @@
+# costing.py
+import re
+
+# Card & Board inputs, in the order they appear on the form
+CARD_INPUT_FIELDS = (
+    "sheet_w", "sheet_l", "gsm", "gen", "kg_price",
+    "freight", "sheet_pkt", "prod_w", "prod_l", "card_qty"
+)
+
+# Add-on costs and the field saying whether each is per_piece or per_order
+ADD_ON_COSTS = (
+    ("artwork_cost", "artwork_cost_type"),
+    ("printing_color_cost", "printing_color_cost_type"),
+    ("foil_cost", "foil_cost_type"),
+    ("screen_cost", "screen_cost_type"),
+    ("heat_cost", "heat_cost_type"),
+    ("emboss_cost", "emboss_cost_type"),
+    ("coating_cost", "coating_cost_type"),
+    ("cutting_cost", "cutting_cost_type"),
+)
+
+
+def card_board_cost(sheet_w, sheet_l, gsm, gen, kg_price, freight, sheet_pkt, prod_w, prod_l, card_qty):
+    """
+    Run the Card & Board costing snippet and return every intermediate value.
+    Raises ValueError if Gen or sheet/pkt is zero.
+    """
+    # total-inches = sW*sL
+    total_inches = sheet_w * sheet_l
+    # inches*gsm = total_inches*gsm
+    inches_gsm = total_inches * gsm
+    # weight/sheet = (inches_gsm)/gen
+    if gen == 0:
+        raise ValueError("Gen cannot be zero.")
+    w_sheet = inches_gsm / gen
+    # price/pkt = (w_sheet*kg_price)+freight
+    price_pkt = (w_sheet * kg_price) + freight
+    # sheet/pkt => user input sheet_pkt
+    if sheet_pkt == 0:
+        raise ValueError("sheet/pkt cannot be zero.")
+    price_sheet = price_pkt / sheet_pkt
+
+    # total product size = pW*pL
+    tot_prod_sz = prod_w * prod_l
+    # product qty/sheet = total_inches / tot_prod_sz
+    pq_sheet = 0.0
+    if tot_prod_sz != 0:
+        pq_sheet = total_inches / tot_prod_sz
+
+    # how many sheets = cQ / pq_sheet
+    sheets_req = pq_sheet and card_qty / pq_sheet or 0
+    # packets req = sheets_req / sheet_pkt
+    packets_req = sheet_pkt and sheets_req / sheet_pkt or 0
+    # rate/piece = price_sheet / pq_sheet
+    rate_piece = pq_sheet and price_sheet / pq_sheet or 0
+    # rate/inch = price_sheet / total_inches
+    rate_inch = total_inches and price_sheet / total_inches or 0
+
+    return {
+        "sheet_w": sheet_w,
+        "sheet_l": sheet_l,
+        "total_inches": total_inches,
+        "gsm": gsm,
+        "inches_gsm": inches_gsm,
+        "gen": gen,
+        "w_sheet": w_sheet,
+        "kg_price": kg_price,
+        "freight": freight,
+        "price_pkt": price_pkt,
+        "sheet_pkt": sheet_pkt,
+        "price_sheet": price_sheet,
+        "prod_w": prod_w,
+        "prod_l": prod_l,
+        "tot_prod_sz": tot_prod_sz,
+        "pq_sheet": pq_sheet,
+        "card_qty": card_qty,
+        "sheets_req": sheets_req,
+        "packets_req": packets_req,
+        "rate_piece": rate_piece,
+        "rate_inch": rate_inch,
+    }
+
+
+def card_board_details(r: dict) -> str:
+    """
+    Build the textual breakdown stored in card_calc_details.
+    """
+    lines = []
+    lines.append(f"SheetW-in={r['sheet_w']}, SheetL-in={r['sheet_l']}, Tot-in={r['total_inches']}")
+    lines.append(f"Gsm={r['gsm']}, inches*gsm={r['inches_gsm']}, Gen={r['gen']}")
+    lines.append(f"Weight/sheet={r['w_sheet']:.3f}")
+    lines.append(f"KgPrice={r['kg_price']}, Freight={r['freight']}, Price/pkt={r['price_pkt']:.2f}")
+    lines.append(f"sheet/pkt={r['sheet_pkt']}, Price/sheet={r['price_sheet']:.3f}")
+    lines.append(f"Prod W-in={r['prod_w']}, L-in={r['prod_l']}, TotSz={r['tot_prod_sz']:.3f}")
+    lines.append(f"ProdQty/Sheet={r['pq_sheet']:.3f}, OrderQty={r['card_qty']}, SheetsReq={r['sheets_req']:.3f}")
+    lines.append(f"PacketsReq={r['packets_req']:.3f}, Rate/Pc={r['rate_piece']:.4f}, Rate/inch={r['rate_inch']:.4f}")
+    return "\n".join(lines)
+
+
+# Labels in card_calc_details that hold the raw user inputs
+_DETAIL_LABELS = {
+    "SheetW-in": "sheet_w",
+    "SheetL-in": "sheet_l",
+    "Gsm": "gsm",
+    "Gen": "gen",
+    "KgPrice": "kg_price",
+    "Freight": "freight",
+    "sheet/pkt": "sheet_pkt",
+    "Prod W-in": "prod_w",
+    "L-in": "prod_l",
+    "OrderQty": "card_qty",
+}
+_DETAIL_RE = re.compile(r"([A-Za-z][\w/ *-]*?)=(-?[\d.eE+-]+)")
+
+
+def parse_card_details(text: str):
+    """
+    Recover the Card & Board inputs from a card_calc_details string written
+    before the inputs were stored as columns. Returns None if any are missing.
+    """
+    if not text:
+        return None
+    found = {}
+    for label, value in _DETAIL_RE.findall(text):
+        key = _DETAIL_LABELS.get(label.strip())
+        if key and key not in found:
+            try:
+                found[key] = float(value)
+            except ValueError:
+                return None
+    if len(found) != len(CARD_INPUT_FIELDS):
+        return None
+    return found
+
+
+def card_inputs(row):
+    """
+    The Card & Board inputs of a saved estimate (a row or mapping with the
+    input columns and card_calc_details) as a dict, or None if they can't
+    be recovered.
+    """
+    inputs = {name: row[name] for name in CARD_INPUT_FIELDS}
+    if None in inputs.values():
+        # Saved before inputs were stored as columns; fall back to the text
+        inputs = parse_card_details(row["card_calc_details"])
+    return inputs
@@ -1,17 +1,174 @@
 # database.py
 import sqlite3
+from datetime import datetime
 
 DB_NAME = "cost_estimator.db"
 
+# Columns added after the first release, with their types
+ADDED_COLUMNS = (
+    ("sheet_w", "REAL"),
+    ("sheet_l", "REAL"),
+    ("gen", "REAL"),
+    ("kg_price", "REAL"),
+    ("freight", "REAL"),
+    ("sheet_pkt", "REAL"),
+    ("prod_w", "REAL"),
+    ("prod_l", "REAL"),
+    ("card_qty", "REAL"),
+    ("price_version", "INTEGER DEFAULT 1"),
+    ("created_at", "TEXT"),
+)
+
+# Seconds a connection waits on a locked database before raising
+BUSY_TIMEOUT = 30.0
+
 def get_connection():
-    return sqlite3.connect(DB_NAME)
+    return sqlite3.connect(DB_NAME, timeout=BUSY_TIMEOUT)
+
+def get_read_connection():
+    """
+    Read-only connection. In WAL mode readers never block the writer.
+    """
+    return sqlite3.connect(f"file:{DB_NAME}?mode=ro", uri=True, timeout=BUSY_TIMEOUT)
 
 def init_db():
     conn = get_connection()
     cursor = conn.cursor()
 
+    # WAL lets readers run alongside the writer; the setting sticks to the file
+    cursor.execute("PRAGMA journal_mode=WAL")
+
+    create_estimates_table(cursor)
+
+    # Per-client lookups (autocomplete, quote book)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cost_estimates_client ON cost_estimates(client_name)")
+    # Recent-history queries and archival (see archive.py)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_cost_estimates_created ON cost_estimates(created_at)")
+
+    # One row per re-pricing of an estimate (see repricing.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cost_estimate_reprices (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            estimate_id INTEGER,
+            price_version INTEGER,
+            repriced_at TEXT,
+
+            old_kg_price REAL,
+            new_kg_price REAL,
+            old_total_cost_per_piece REAL,
+            new_total_cost_per_piece REAL,
+            old_total_cost_order REAL,
+            new_total_cost_order REAL
+        )
+    ''')
+
+    # Revisions of an estimate as field deltas, append-only (see revisions.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cost_estimate_revisions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            estimate_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL,
+            parent_revision INTEGER NOT NULL,
+            depth INTEGER NOT NULL,
+            is_snapshot INTEGER NOT NULL,
+            fields TEXT NOT NULL,
+            note TEXT,
+            created_at TEXT,
+            UNIQUE (estimate_id, revision)
+        )
+    ''')
+    for action in ("UPDATE", "DELETE"):
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS cost_estimate_revisions_no_{action.lower()}
+            BEFORE {action} ON cost_estimate_revisions
+            BEGIN
+                SELECT RAISE(ABORT, 'cost_estimate_revisions is append-only');
+            END
+        ''')
+
+    # Client spellings merged into another (see dedup.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS client_name_merges (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            merged_at TEXT,
+            variant TEXT,
+            canonical TEXT
+        )
+    ''')
+
+    # Board needed by confirmed Card & Board orders, and board in stock (see procurement.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_orders (
+            estimate_id INTEGER PRIMARY KEY,
+            revision INTEGER,
+            confirmed_at TEXT,
+            material TEXT,
+            gsm REAL,
+            sheet_w REAL,
+            sheet_l REAL,
+            sheets REAL,
+            packets REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS stock_demand (
+            material TEXT,
+            gsm REAL,
+            sheet_w REAL,
+            sheet_l REAL,
+            orders INTEGER,
+            sheets REAL,
+            packets REAL,
+            PRIMARY KEY (material, gsm, sheet_w, sheet_l)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS paper_stock (
+            material TEXT,
+            gsm REAL,
+            sheet_w REAL,
+            sheet_l REAL,
+            packets INTEGER,
+            updated_at TEXT,
+            PRIMARY KEY (material, gsm, sheet_w, sheet_l)
+        )
+    ''')
+    # stock_demand is kept as running totals of stock_orders
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS stock_orders_insert AFTER INSERT ON stock_orders
+        BEGIN
+            INSERT OR IGNORE INTO stock_demand VALUES (NEW.material, NEW.gsm, NEW.sheet_w, NEW.sheet_l, 0, 0, 0);
+            UPDATE stock_demand
+            SET orders = orders + 1, sheets = sheets + NEW.sheets, packets = packets + NEW.packets
+            WHERE material = NEW.material AND gsm = NEW.gsm AND sheet_w = NEW.sheet_w AND sheet_l = NEW.sheet_l;
+        END
+    ''')
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS cost_estimates (
+        CREATE TRIGGER IF NOT EXISTS stock_orders_delete AFTER DELETE ON stock_orders
+        BEGIN
+            UPDATE stock_demand
+            SET orders = orders - 1, sheets = sheets - OLD.sheets, packets = packets - OLD.packets
+            WHERE material = OLD.material AND gsm = OLD.gsm AND sheet_w = OLD.sheet_w AND sheet_l = OLD.sheet_l;
+            DELETE FROM stock_demand WHERE orders <= 0;
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS stock_orders_no_update BEFORE UPDATE ON stock_orders
+        BEGIN
+            SELECT RAISE(ABORT, 'replace a stock_orders row with DELETE and INSERT');
+        END
+    ''')
+
+    conn.commit()
+    conn.close()
+
+def create_estimates_table(cursor, schema: str = "main"):
+    """
+    Create cost_estimates in the given schema (main or an attached
+    archive), or bring an existing one up to date.
+    """
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS {schema}.cost_estimates (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             client_name TEXT,
             category TEXT,
@@ -28,6 +185,16 @@ def init_db():
             card_calc_cost_per_piece REAL,
             card_calc_details TEXT,
 
+            sheet_w REAL,
+            sheet_l REAL,
+            gen REAL,
+            kg_price REAL,
+            freight REAL,
+            sheet_pkt REAL,
+            prod_w REAL,
+            prod_l REAL,
+            card_qty REAL,
+
             front_colors INTEGER,
             back_colors INTEGER,
             printing_color_cost REAL,
@@ -50,22 +217,26 @@ def init_db():
             cutting_cost_type TEXT,
 
             total_cost_per_piece REAL,
-            total_cost_order REAL
+            total_cost_order REAL,
+            price_version INTEGER DEFAULT 1,
+            created_at TEXT
         )
     ''')
 
-    conn.commit()
-    conn.close()
+    # Older databases: add any columns introduced since they were created
+    existing = {row[1] for row in cursor.execute(f"PRAGMA {schema}.table_info(cost_estimates)")}
+    for col, col_type in ADDED_COLUMNS:
+        if col not in existing:
+            cursor.execute(f"ALTER TABLE {schema}.cost_estimates ADD COLUMN {col} {col_type}")
 
-def save_cost_estimate(data: dict) -> int:
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
+INSERT_ESTIMATE_SQL = '''
         INSERT INTO cost_estimates (
             client_name, category, subcategory, quantity,
             artwork_cost, artwork_cost_type,
             width, length, material, gsm,
             card_calc_cost_per_piece, card_calc_details,
+            sheet_w, sheet_l, gen, kg_price, freight,
+            sheet_pkt, prod_w, prod_l, card_qty,
             front_colors, back_colors, printing_color_cost, printing_color_cost_type,
             foil_cost, foil_cost_type,
             screen_cost, screen_cost_type,
@@ -73,10 +244,20 @@ def save_cost_estimate(data: dict) -> int:
             emboss_cost, emboss_cost_type,
             coating, coating_cost, coating_cost_type,
             cutting_cost, cutting_cost_type,
-            total_cost_per_piece, total_cost_order
+            total_cost_per_piece, total_cost_order,
+            created_at
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+def estimate_params(data) -> tuple:
+    """
+    Parameters for INSERT_ESTIMATE_SQL, in column order.
+    `data` is a quote.Quote or a dict with the same keys.
+    """
+    if hasattr(data, "to_params"):
+        return data.to_params()
+    return (
         data["client_name"],
         data["category"],
         data["subcategory"],
@@ -92,6 +273,16 @@ def save_cost_estimate(data: dict) -> int:
         data["card_calc_cost_per_piece"],
         data.get("card_calc_details", ""),
 
+        data.get("sheet_w"),
+        data.get("sheet_l"),
+        data.get("gen"),
+        data.get("kg_price"),
+        data.get("freight"),
+        data.get("sheet_pkt"),
+        data.get("prod_w"),
+        data.get("prod_l"),
+        data.get("card_qty"),
+
         data["front_colors"],
         data["back_colors"],
         data["printing_color_cost"],
@@ -113,9 +304,82 @@ def save_cost_estimate(data: dict) -> int:
         data["cutting_cost_type"],
 
         data["total_cost_per_piece"],
-        data["total_cost_order"]
-    ))
+        data["total_cost_order"],
+
+        data.get("created_at") or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    )
+
+def save_cost_estimate(data) -> int:
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(INSERT_ESTIMATE_SQL, estimate_params(data))
     conn.commit()
     new_id = cursor.lastrowid
     conn.close()
     return new_id
+
+def get_client_names(include_archive: bool = True) -> list:
+    """
+    Distinct non-empty client names for the Client autocomplete, hot and
+    (unless include_archive is False) archived.
+    """
+    import archive  # archive imports this module
+    conn = get_read_connection()
+    try:
+        sql = """
+            SELECT DISTINCT client_name FROM cost_estimates
+            WHERE client_name IS NOT NULL AND client_name != ''
+        """
+        if include_archive:
+            rows = archive.iter_history(conn, sql)
+        else:
+            rows = conn.execute(sql)
+        names = {r[0] for r in rows}
+    finally:
+        conn.close()
+    return list(names)
+
+def get_client_summary(client_name: str, conn=None) -> list:
+    """
+    (category, subcategory, quotes, pieces, grand total) per product for one
+    client, hot and archived. Reads the hot database on conn if given (e.g.
+    inside a caller's read transaction).
+    """
+    import archive
+    own = conn is None
+    if own:
+        conn = get_read_connection()
+    totals = {}
+    try:
+        # One partial sum per archive year and one for the hot database
+        for category, subcategory, quotes, pieces, total in archive.iter_history(conn, '''
+            SELECT category, subcategory, COUNT(*), SUM(quantity), SUM(total_cost_order)
+            FROM cost_estimates
+            WHERE client_name = ?
+            GROUP BY category, subcategory
+        ''', (client_name,)):
+            q, p, t = totals.get((category, subcategory), (0, 0, 0.0))
+            totals[(category, subcategory)] = (q + quotes, p + (pieces or 0), t + (total or 0.0))
+    finally:
+        if own:
+            conn.close()
+    return [key + totals[key] for key in sorted(totals, key=lambda k: (k[0] or "", k[1] or ""))]
+
+def iter_client_estimates(client_name: str, conn=None):
+    """
+    Yield one client's estimates, archived then hot, as sqlite3.Row
+    objects, oldest first, without loading them all. Reads the hot database
+    on conn if given.
+    """
+    import archive
+    own = conn is None
+    if own:
+        conn = get_read_connection()
+    try:
+        yield from archive.iter_history(
+            conn, "SELECT * FROM cost_estimates WHERE client_name = ? ORDER BY id",
+            (client_name,), row_factory=sqlite3.Row
+        )
+    finally:
+        if own:
+            conn.close()
@@ -0,0 +1,354 @@
+# dedup.py
+"""
+Find and merge client names that are spellings of the same buyer.
+
+Names are reduced to a match key (case, spacing, punctuation, "M/s" and
+company suffixes dropped). A blocking index files every key under a few
+cheap keys (phonetic codes of neighbouring words, first and last letters),
+and a name is only compared with names sharing a block, so the work grows
+with the number of names rather than its square. Going from the most-used
+spelling down, each name either joins the closest spelling already chosen
+as a client or starts a new one; every group is proposed as a merge into
+its most-used spelling.
+
+Usage:
+    python dedup.py --propose merges.csv   # write proposals for review
+    python dedup.py --apply merges.csv     # rename rows as listed in the file
+"""
+import argparse
+import csv
+import re
+from collections import defaultdict
+from datetime import datetime
+
+import archive
+import database
+import writer
+from client_index import normalize
+
+SIMILARITY = 0.85
+# Blocks bigger than this say little about a match (a common word); they are skipped
+MAX_BLOCK = 100
+BATCH_SIZE = 5000
+
+_STOP_WORDS = frozenset((
+    "the", "and", "co", "company", "ltd", "limited", "pvt", "private",
+    "inc", "corp", "corporation", "llc", "plc", "pk",
+))
+_PREFIX_RE = re.compile(r"^m\s*/\s*s\.?\s+")
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def match_key(name: str) -> str:
+    """
+    The part of a client name that identifies the buyer.
+    """
+    key = _PREFIX_RE.sub("", normalize(name or "")).replace("&", " and ")
+    words = _NON_WORD_RE.sub(" ", key).split()
+    kept = [w for w in words if w not in _STOP_WORDS]
+    return " ".join(kept or words)
+
+
+_SOUNDEX = {c: d for d, letters in (
+    ("1", "bfpv"), ("2", "cgjkqsxz"), ("3", "dt"), ("4", "l"), ("5", "mn"), ("6", "r")
+) for c in letters}
+
+
+def soundex(word: str) -> str:
+    code = word[0]
+    last = _SOUNDEX.get(word[0], "")
+    for c in word[1:]:
+        d = _SOUNDEX.get(c, "")
+        if d and d != last:
+            code += d
+            if len(code) == 4:
+                break
+        if c not in "hw":
+            last = d
+    return code.ljust(4, "0")
+
+
+def _numbers(key: str) -> tuple:
+    return tuple(sorted(w for w in key.split() if w.isdigit()))
+
+
+def block_keys(key: str) -> set:
+    """
+    Blocking keys of a match key: the Soundex codes of each pair of
+    neighbouring words and the first and last five letters, all tagged with
+    the name's numbers (names with different numbers are never merged).
+    """
+    tag = "#" + ",".join(_numbers(key))
+    compact = key.replace(" ", "")
+    keys = {"p:" + compact[:5] + tag, "s:" + compact[-5:] + tag}
+    codes = [soundex(w) for w in key.split() if not w.isdigit()]
+    if len(codes) == 1:
+        keys.add("w:" + codes[0] + tag)
+    keys.update("w:" + x + y + tag for x, y in zip(codes, codes[1:]))
+    return keys
+
+
+def _distance(a: str, b: str, limit: int):
+    """
+    Levenshtein distance, or None if it is more than limit. Only a band of
+    width 2 * limit + 1 around the diagonal is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return None
+    over = limit + 1
+    prev = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        cur = [over] * (len(b) + 1)
+        if i <= limit:
+            cur[0] = i
+        for j in range(lo, hi + 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != b[j - 1]))
+        if min(cur[lo - 1:hi + 1]) > limit:
+            return None
+        prev = cur
+    return prev[-1] if prev[-1] <= limit else None
+
+
+def _word_distance(a: list, b: list, floor: float):
+    """
+    Total edit distance between two equally long word lists, or None if any
+    word is further from its partner than its own length allows or starts
+    with a different letter.
+    """
+    total = 0
+    for x, y in zip(a, b):
+        if x == y:
+            continue
+        # Misspellings rarely change the first letter; Bilal and Hilal are two clients
+        if x[0] != y[0]:
+            return None
+        d = _distance(x, y, max(1, int(max(len(x), len(y)) * (1 - floor))))
+        if d is None:
+            return None
+        total += d
+    return total
+
+
+def similarity(a: str, b: str, floor: float = SIMILARITY) -> float:
+    """
+    1 - edit distance / length for two match keys; 0.0 if below floor.
+    Names with the same number of words are compared word by word (in order,
+    or both sorted) so a differing short word isn't hidden by long shared
+    ones; otherwise only words run together or split apart, plus one typo,
+    are allowed. Names whose numbers differ never match.
+    """
+    longest = max(len(a), len(b))
+    if not longest:
+        return 1.0
+    if _numbers(a) != _numbers(b):
+        return 0.0
+    wa, wb = a.split(), b.split()
+    if len(wa) == len(wb):
+        found = [d for d in (_word_distance(wa, wb, floor), _word_distance(sorted(wa), sorted(wb), floor))
+                 if d is not None]
+        d = min(found) if found else None
+    else:
+        d = _distance(a.replace(" ", ""), b.replace(" ", ""), 1)
+    if d is None:
+        return 0.0
+    score = 1 - d / longest
+    return score if score >= floor else 0.0
+
+
+def client_counts() -> dict:
+    """
+    {client_name: estimates} over the hot database and every archive year,
+    the same rows apply_merges renames.
+    """
+    counts = defaultdict(int)
+    conn = database.get_read_connection()
+    try:
+        for name, n in archive.iter_history(conn, '''
+            SELECT client_name, COUNT(*) FROM cost_estimates
+            WHERE client_name IS NOT NULL AND client_name != ''
+            GROUP BY client_name
+        '''):
+            counts[name] += n
+    finally:
+        conn.close()
+    return dict(counts)
+
+
+def propose_merges(counts: dict, floor: float = SIMILARITY) -> list:
+    """
+    Groups of spellings that look like one client, from {name: estimates}.
+    Each proposal is (canonical name, [(variant, estimates, similarity to
+    canonical)]); the canonical name is the spelling with most estimates.
+    """
+    # Spellings with the same match key are the same client outright
+    by_key = defaultdict(list)
+    for name, n in counts.items():
+        by_key[match_key(name)].append(name)
+    keys = [k for k in by_key if k]
+
+    # Most-used spellings first, so they become the names others merge into
+    weight = {key: sum(counts[name] for name in by_key[key]) for key in keys}
+    keys.sort(key=lambda k: -weight[k])
+    key_blocks = [block_keys(key) for key in keys]
+    block_size = defaultdict(int)
+    for kb in key_blocks:
+        for b in kb:
+            block_size[b] += 1
+
+    # Each key joins the most similar earlier leader it shares a block with,
+    # or becomes a leader itself; comparing with leaders only keeps chains
+    # like A~B~C from merging A with an unlike C
+    leaders = defaultdict(list)
+    groups = {}
+    for i, key in enumerate(keys):
+        blocks = [b for b in key_blocks[i] if block_size[b] <= MAX_BLOCK]
+        best, best_score = None, 0.0
+        tried = set()
+        for b in blocks:
+            for j in leaders[b]:
+                if j not in tried:
+                    tried.add(j)
+                    score = similarity(keys[j], key, floor)
+                    if score > best_score:
+                        best, best_score = j, score
+        if best is None:
+            groups[i] = list(by_key[key])
+            for b in blocks:
+                leaders[b].append(i)
+        else:
+            groups[best].extend(by_key[key])
+
+    proposals = []
+    for names in groups.values():
+        if len(names) < 2:
+            continue
+        names.sort(key=lambda name: (-counts[name], name))
+        canonical, canonical_key = names[0], match_key(names[0])
+        variants = [(name, counts[name], similarity(canonical_key, match_key(name), 0.0))
+                    for name in names[1:]]
+        proposals.append((canonical, variants))
+    proposals.sort(key=lambda p: -sum(n for _, n, _ in p[1]))
+    return proposals
+
+
+def write_proposals(proposals, path: str):
+    """
+    Write proposals as a CSV (variant, canonical, estimates, similarity) to
+    review; delete lines or edit the canonical column before --apply.
+    """
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("variant", "canonical", "estimates", "similarity"))
+        for canonical, variants in proposals:
+            for variant, n, score in variants:
+                writer.writerow((variant, canonical, n, f"{score:.3f}"))
+
+
+def read_merges(path: str) -> dict:
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["variant"]: row["canonical"] for row in csv.DictReader(f)
+                if row["variant"] and row["canonical"] and row["variant"] != row["canonical"]}
+
+
+def _rename(conn, schema: str, batch_size: int) -> int:
+    renamed = 0
+    while True:
+        writer.begin(conn)
+        cursor = conn.execute(f'''
+            UPDATE {schema}.cost_estimates
+            SET client_name = (SELECT canonical FROM temp.client_merges WHERE variant = client_name)
+            WHERE id IN (
+                SELECT e.id FROM temp.client_merges m
+                JOIN {schema}.cost_estimates e ON e.client_name = m.variant
+                LIMIT ?
+            )
+        ''', (batch_size,))
+        conn.execute("COMMIT")
+        if cursor.rowcount <= 0:
+            return renamed
+        renamed += cursor.rowcount
+
+
+def resolve_merges(merges: dict) -> dict:
+    """
+    {variant: canonical} with chains followed to their end (A -> B and
+    B -> C become A -> C and B -> C). Raises ValueError on a cycle.
+    """
+    merges = {v: c for v, c in merges.items() if v != c}
+    resolved = {}
+    for variant in merges:
+        path = [variant]
+        target = merges[variant]
+        while target in merges:
+            if target in path:
+                raise ValueError("Merge cycle: " + " -> ".join(path + [target]))
+            path.append(target)
+            target = merges[target]
+        resolved[variant] = target
+    return resolved
+
+
+def apply_merges(merges: dict, batch_size: int = BATCH_SIZE) -> int:
+    """
+    Rename every estimate whose client_name is a key of merges to its value,
+    batch_size rows per transaction, in the hot database and in every
+    archive year. Raises ValueError, before renaming anything, if the
+    merges form a cycle. Returns the number of rows renamed.
+    """
+    resolved = resolve_merges(merges)
+    # A canonical name that is still a variant would be renamed back and
+    # forth by _rename forever
+    unresolved = sorted(set(resolved.values()) & set(resolved))
+    if unresolved:
+        raise ValueError(f"Canonical names also listed as variants: {', '.join(unresolved)}")
+
+    # Archive years are ATTACHed one by one, which a group's transaction
+    # wouldn't allow
+    return writer.run_job(lambda conn: _apply(conn, resolved, batch_size))
+
+
+def _apply(conn, resolved: dict, batch_size: int) -> int:
+    renamed = 0
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS client_merges (variant TEXT PRIMARY KEY, canonical TEXT)")
+    conn.execute("DELETE FROM temp.client_merges")
+    conn.executemany("INSERT INTO temp.client_merges VALUES (?, ?)", resolved.items())
+
+    renamed += _rename(conn, "main", batch_size)
+    for year in archive.archive_years():
+        conn.execute("ATTACH DATABASE ? AS arc", (archive.archive_path(year),))
+        try:
+            renamed += _rename(conn, "arc", batch_size)
+        finally:
+            conn.execute("DETACH DATABASE arc")
+
+    writer.begin(conn)
+    conn.executemany('''
+        INSERT INTO client_name_merges (merged_at, variant, canonical) VALUES (?, ?, ?)
+    ''', [(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), v, c) for v, c in resolved.items()])
+    conn.execute("COMMIT")
+    return renamed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find and merge duplicate client names.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--propose", metavar="CSV", help="write merge proposals to this file")
+    group.add_argument("--apply", metavar="CSV", help="apply the merges listed in this file")
+    parser.add_argument("--similarity", type=float, default=SIMILARITY)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    if args.propose:
+        proposals = propose_merges(client_counts(), args.similarity)
+        write_proposals(proposals, args.propose)
+        variants = sum(len(v) for _, v in proposals)
+        print(f"{len(proposals)} clients with {variants} other spellings -> {args.propose}")
+    else:
+        merges = read_merges(args.apply)
+        print(f"Renamed {apply_merges(merges, args.batch_size)} estimates ({len(merges)} spellings).")
+
+
+if __name__ == "__main__":
+    main()
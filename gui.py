@@ -1,8 +1,19 @@
 # gui.py
 
+import logging
+import sqlite3
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, simpledialog
 import database
+import costing
+import analysis
+import procurement
+import reports
+import revisions
+import validation
+import writer
+from client_index import ClientIndex
+from quote import Quote
 
 # For PDF generation
 from reportlab.pdfgen import canvas
@@ -10,6 +21,8 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import inch
 from datetime import datetime
 
+log = logging.getLogger(__name__)
+
 
 # Product categories & subcategories
 PRODUCT_CATEGORIES = {
@@ -79,6 +92,77 @@ class ScrollableFrame(ttk.Frame):
         self.scrollbar.pack(side="right", fill="y")
 
 
+class AutocompleteEntry(tk.Entry):
+    """
+    An Entry that shows a dropdown of suggestions from a ClientIndex as the user types.
+    Down moves into the list, Return or click picks, Escape closes it.
+    """
+    def __init__(self, container, index, *args, **kwargs):
+        super().__init__(container, *args, **kwargs)
+        self.index = index
+        self.popup = None
+        self.listbox = None
+
+        self.bind("<KeyRelease>", self.on_key)
+        self.bind("<Down>", self.focus_list)
+        self.bind("<Escape>", lambda e: self.hide())
+        self.bind("<FocusOut>", lambda e: self.after(150, self.hide_if_unfocused))
+
+    def on_key(self, event):
+        if event.keysym in ("Down", "Up", "Return", "Escape", "Tab"):
+            return
+        suggestions = self.index.suggest(self.get())
+        if suggestions and suggestions != [self.get().strip()]:
+            self.show(suggestions)
+        else:
+            self.hide()
+
+    def show(self, suggestions):
+        if self.popup is None:
+            self.popup = tk.Toplevel(self)
+            self.popup.wm_overrideredirect(True)
+            self.listbox = tk.Listbox(self.popup, width=self["width"], height=len(suggestions), exportselection=False)
+            self.listbox.pack(fill="both", expand=True)
+            self.listbox.bind("<ButtonRelease-1>", self.pick)
+            self.listbox.bind("<Return>", self.pick)
+            self.listbox.bind("<Escape>", lambda e: (self.hide(), self.focus_set()))
+
+        self.listbox.delete(0, tk.END)
+        for s in suggestions:
+            self.listbox.insert(tk.END, s)
+        self.listbox.config(height=len(suggestions))
+        x = self.winfo_rootx()
+        y = self.winfo_rooty() + self.winfo_height()
+        self.popup.wm_geometry(f"+{x}+{y}")
+        self.popup.deiconify()
+        self.popup.lift()
+
+    def focus_list(self, event=None):
+        if self.popup is not None and self.listbox.size():
+            self.listbox.focus_set()
+            self.listbox.selection_clear(0, tk.END)
+            self.listbox.selection_set(0)
+            self.listbox.activate(0)
+        return "break"
+
+    def pick(self, event=None):
+        sel = self.listbox.curselection()
+        if sel:
+            self.delete(0, tk.END)
+            self.insert(0, self.listbox.get(sel[0]))
+        self.hide()
+        self.focus_set()
+        self.icursor(tk.END)
+
+    def hide_if_unfocused(self):
+        if self.popup is not None and self.focus_get() is not self.listbox:
+            self.hide()
+
+    def hide(self):
+        if self.popup is not None:
+            self.popup.withdraw()
+
+
 class CostEstimatorApp(tk.Frame):
     """
     Main Cost Estimator interface, including:
@@ -89,7 +173,10 @@ class CostEstimatorApp(tk.Frame):
       - Card & Board fields (shown only if "Card & Board" is selected)
       - Additional specs (printing, foil, etc.)
       - Generate PDF report
-      - Save to DB
+      - Save to DB (as a new estimate or a revision of the last one saved)
+      - Quote history
+      - Confirm orders and list the board to buy
+      - Price drivers (sensitivity and break-even analysis)
     """
     def __init__(self, master=None):
         super().__init__(master)
@@ -100,6 +187,20 @@ class CostEstimatorApp(tk.Frame):
         # Initialize or migrate the DB
         database.init_db()
 
+        # Known client names for the Client autocomplete; an unreadable
+        # archive only costs the archived names, not the app
+        try:
+            names = database.get_client_names()
+        except sqlite3.Error:
+            log.exception("Could not read archived client names; autocomplete uses the hot database only")
+            names = database.get_client_names(include_archive=False)
+        self.client_index = ClientIndex(names)
+
+        # ID of the estimate last saved, so a recalculation can be saved as its revision
+        self.current_estimate_id = None
+        # Where the Price Drivers text starts in result_text, so it can be replaced
+        self.analysis_start = None
+
         # Wrap UI in a scrollable frame
         self.scroll_container = ScrollableFrame(self.master)
         self.scroll_container.pack(fill="both", expand=True)
@@ -119,7 +220,7 @@ class CostEstimatorApp(tk.Frame):
         # 1) Client
         tk.Label(parent, text="Client:", font=("Arial", 10, "bold")).grid(row=row_idx, column=0, sticky="e", padx=5, pady=5)
         self.client_name_var = tk.StringVar()
-        tk.Entry(parent, textvariable=self.client_name_var, width=30).grid(row=row_idx, column=1, padx=5, pady=5)
+        AutocompleteEntry(parent, self.client_index, textvariable=self.client_name_var, width=30).grid(row=row_idx, column=1, padx=5, pady=5)
         row_idx += 1
 
         # 2) Category
@@ -320,8 +421,7 @@ class CostEstimatorApp(tk.Frame):
         # 13) Coating
         tk.Label(parent, text="Coating:", font=("Arial", 10, "bold")).grid(row=row_idx, column=0, sticky="e", padx=5, pady=5)
         self.coat_var = tk.StringVar(value="None")
-        coat_opts = ["None", "UV Coating", "Lamination"]
-        self.coat_combo = ttk.Combobox(parent, textvariable=self.coat_var, values=coat_opts, state="readonly")
+        self.coat_combo = ttk.Combobox(parent, textvariable=self.coat_var, values=validation.COATINGS, state="readonly")
         self.coat_combo.grid(row=row_idx, column=1, padx=5, pady=5)
 
         tk.Label(parent, text="Coat Cost:", font=("Arial", 10, "bold")).grid(row=row_idx, column=2, sticky="e", padx=5, pady=5)
@@ -352,7 +452,24 @@ class CostEstimatorApp(tk.Frame):
         save_btn.grid(row=row_idx, column=1, columnspan=1, pady=15)
 
         pdf_btn = ttk.Button(parent, text="Generate PDF", command=self.generate_pdf)
-        pdf_btn.grid(row=row_idx, column=2, columnspan=2, pady=15)
+        pdf_btn.grid(row=row_idx, column=2, columnspan=1, pady=15)
+
+        book_btn = ttk.Button(parent, text="Client Quote Book", command=self.generate_quote_book)
+        book_btn.grid(row=row_idx, column=3, columnspan=1, pady=15)
+
+        row_idx += 1
+
+        history_btn = ttk.Button(parent, text="Quote History", command=self.show_history)
+        history_btn.grid(row=row_idx, column=0, columnspan=1, pady=(0, 10))
+
+        confirm_btn = ttk.Button(parent, text="Confirm Order", command=self.confirm_order)
+        confirm_btn.grid(row=row_idx, column=1, columnspan=1, pady=(0, 10))
+
+        purchase_btn = ttk.Button(parent, text="Board Purchase List", command=self.show_purchase_list)
+        purchase_btn.grid(row=row_idx, column=2, columnspan=1, pady=(0, 10))
+
+        analyze_btn = ttk.Button(parent, text="Price Drivers", command=self.show_analysis)
+        analyze_btn.grid(row=row_idx, column=3, columnspan=1, pady=(0, 10))
 
         row_idx += 1
 
@@ -400,137 +517,111 @@ class CostEstimatorApp(tk.Frame):
         1) If 'Card & Board', do the advanced snippet logic with user 'Gen' etc.
         2) Combine with the 'per piece/per order' items for a final cost.
         3) Display the breakdown in result_text.
-        4) Keep the data in self.calculated_data for DB or PDF usage.
+        4) Keep the data in self.calculated_data (a Quote) for DB or PDF usage.
         """
         self.result_text.config(state="normal")
         self.result_text.delete("1.0", tk.END)
-
-        # Basic info
-        client_name = self.client_name_var.get().strip()
-        category = self.category_var.get()
-        subcat = self.subcategory_var.get()
-
+        self.analysis_start = None
+
+        # Parse and check every input at once
+        raw = {
+            "client_name": self.client_name_var.get(),
+            "category": self.category_var.get(),
+            "subcategory": self.subcategory_var.get(),
+            "quantity": self.quantity_var.get(),
+            "artwork_cost": self.artwork_cost_var.get(),
+            "artwork_cost_type": self.artwork_cost_type_var.get(),
+            "width": self.width_var.get(),
+            "length": self.length_var.get(),
+            "material": self.material_var.get(),
+
+            "sheet_w": self.sheetW_var.get(),
+            "sheet_l": self.sheetL_var.get(),
+            "gsm": self.gsm_var.get(),
+            "gen": self.gen_var.get(),
+            "kg_price": self.kgPrice_var.get(),
+            "freight": self.freight_var.get(),
+            "sheet_pkt": self.sheetPkt_var.get(),
+            "prod_w": self.prodW_var.get(),
+            "prod_l": self.prodL_var.get(),
+            "card_qty": self.cardQty_var.get(),
+
+            "front_colors": self.printFront_var.get(),
+            "back_colors": self.printBack_var.get(),
+            "printing_color_cost": self.printColorCost_var.get(),
+            "printing_color_cost_type": self.printColorCost_type_var.get(),
+            "foil_cost": self.foil_var.get(),
+            "foil_cost_type": self.foil_type_var.get(),
+            "screen_cost": self.screen_var.get(),
+            "screen_cost_type": self.screen_type_var.get(),
+            "heat_cost": self.heat_var.get(),
+            "heat_cost_type": self.heat_type_var.get(),
+            "emboss_cost": self.emboss_var.get(),
+            "emboss_cost_type": self.emboss_type_var.get(),
+            "coating": self.coat_var.get(),
+            "coating_cost": self.coatCost_var.get(),
+            "coating_cost_type": self.coat_type_var.get(),
+            "cutting_cost": self.cut_var.get(),
+            "cutting_cost_type": self.cut_type_var.get(),
+        }
         try:
-            qty_pieces = int(self.quantity_var.get() or 0)
-        except ValueError:
-            messagebox.showerror("Error", "Invalid quantity of pieces.")
+            v = validation.parse_quote(raw)
+        except validation.ValidationError as e:
+            messagebox.showerror("Error", f"Please correct the following:\n\n{e}")
             return
 
+        # Basic info
+        client_name = v["client_name"]
+        category = v["category"]
+        subcat = v["subcategory"]
+        qty_pieces = v["quantity"]
+
         # Artwork
-        try:
-            aw_cost = float(self.artwork_cost_var.get() or 0)
-        except ValueError:
-            messagebox.showerror("Error", "Invalid artwork cost.")
-            return
-        aw_type = self.artwork_cost_type_var.get()
+        aw_cost = v["artwork_cost"]
+        aw_type = v["artwork_cost_type"]
 
         # Basic size
-        try:
-            w_val = float(self.width_var.get() or 0)
-            l_val = float(self.length_var.get() or 0)
-        except ValueError:
-            messagebox.showerror("Error", "Invalid Width/Length (in).")
-            return
+        w_val = v["width"]
+        l_val = v["length"]
 
-        mat = self.material_var.get()
+        mat = v["material"]
 
         # Default
         card_calc_cost_per_piece = 0.0
         card_calc_details = ""
+        card = {}
 
         if mat == "Card & Board":
-            # Attempt to parse the new fields
-            try:
-                sW = float(self.sheetW_var.get() or 0)
-                sL = float(self.sheetL_var.get() or 0)
-                gsm_val = float(self.gsm_var.get() or 0)
-                gen_val = float(self.gen_var.get() or 0)
-                kg_price = float(self.kgPrice_var.get() or 0)
-                freight_val = float(self.freight_var.get() or 0)
-                sheet_pkt = float(self.sheetPkt_var.get() or 0)
-                pW = float(self.prodW_var.get() or 0)
-                pL = float(self.prodL_var.get() or 0)
-                cQ = float(self.cardQty_var.get() or 0)
-            except ValueError:
-                messagebox.showerror("Error", "Check Card & Board fields; must be numeric.")
-                return
-
-            # total-inches = sW*sL
-            total_inches = sW * sL
-            # inches*gsm = total_inches*gsm_val
-            inches_gsm = total_inches * gsm_val
-            # weight/sheet = (inches_gsm)/gen_val
-            if gen_val == 0:
-                messagebox.showerror("Error", "Gen cannot be zero.")
-                return
-            w_sheet = inches_gsm / gen_val
-            # price/pkt = (w_sheet*kg_price)+freight_val
-            price_pkt = (w_sheet * kg_price) + freight_val
-            # sheet/pkt => user input sheet_pkt
-            if sheet_pkt == 0:
-                messagebox.showerror("Error", "sheet/pkt cannot be zero.")
-                return
-            price_sheet = price_pkt / sheet_pkt
-
-            # total product size = pW*pL
-            tot_prod_sz = pW * pL
-            # product qty/sheet = total_inches / tot_prod_sz
-            pq_sheet = 0.0
-            if tot_prod_sz != 0:
-                pq_sheet = total_inches / tot_prod_sz
-
-            # how many sheets = cQ / pq_sheet
-            sheets_req = pq_sheet and cQ / pq_sheet or 0
-            # packets req = sheets_req / sheet_pkt
-            packets_req = sheet_pkt and sheets_req / sheet_pkt or 0
-            # rate/piece = price_sheet / pq_sheet
-            rate_piece = pq_sheet and price_sheet / pq_sheet or 0
-            # rate/inch = price_sheet / total_inches
-            rate_inch = total_inches and price_sheet / total_inches or 0
-
-            card_calc_cost_per_piece = rate_piece
-
-            # Build textual breakdown
-            lines = []
-            lines.append(f"SheetW-in={sW}, SheetL-in={sL}, Tot-in={total_inches}")
-            lines.append(f"Gsm={gsm_val}, inches*gsm={inches_gsm}, Gen={gen_val}")
-            lines.append(f"Weight/sheet={w_sheet:.3f}")
-            lines.append(f"KgPrice={kg_price}, Freight={freight_val}, Price/pkt={price_pkt:.2f}")
-            lines.append(f"sheet/pkt={sheet_pkt}, Price/sheet={price_sheet:.3f}")
-            lines.append(f"Prod W-in={pW}, L-in={pL}, TotSz={tot_prod_sz:.3f}")
-            lines.append(f"ProdQty/Sheet={pq_sheet:.3f}, OrderQty={cQ}, SheetsReq={sheets_req:.3f}")
-            lines.append(f"PacketsReq={packets_req:.3f}, Rate/Pc={rate_piece:.4f}, Rate/inch={rate_inch:.4f}")
-            card_calc_details = "\n".join(lines)
+            # Gen and sheet/pkt are already checked to be non-zero
+            card = costing.card_board_cost(*(v[name] for name in costing.CARD_INPUT_FIELDS))
+            card_calc_cost_per_piece = card["rate_piece"]
+            card_calc_details = costing.card_board_details(card)
 
         # Additional specs
-        try:
-            fCols = int(self.printFront_var.get() or 0)
-            bCols = int(self.printBack_var.get() or 0)
-        except ValueError:
-            messagebox.showerror("Error", "Invalid printing colors.")
-            return
+        fCols = v["front_colors"]
+        bCols = v["back_colors"]
 
-        pColorC = float(self.printColorCost_var.get() or 0)
-        pColorType = self.printColorCost_type_var.get()
+        pColorC = v["printing_color_cost"]
+        pColorType = v["printing_color_cost_type"]
 
-        foilC = float(self.foil_var.get() or 0)
-        foilT = self.foil_type_var.get()
+        foilC = v["foil_cost"]
+        foilT = v["foil_cost_type"]
 
-        screenC = float(self.screen_var.get() or 0)
-        screenT = self.screen_type_var.get()
+        screenC = v["screen_cost"]
+        screenT = v["screen_cost_type"]
 
-        heatC = float(self.heat_var.get() or 0)
-        heatT = self.heat_type_var.get()
+        heatC = v["heat_cost"]
+        heatT = v["heat_cost_type"]
 
-        embossC = float(self.emboss_var.get() or 0)
-        embossT = self.emboss_type_var.get()
+        embossC = v["emboss_cost"]
+        embossT = v["emboss_cost_type"]
 
-        coat = self.coat_var.get()
-        coatC = float(self.coatCost_var.get() or 0)
-        coatT = self.coat_type_var.get()
+        coat = v["coating"]
+        coatC = v["coating_cost"]
+        coatT = v["coating_cost_type"]
 
-        cutC = float(self.cut_var.get() or 0)
-        cutT = self.cut_type_var.get()
+        cutC = v["cutting_cost"]
+        cutT = v["cutting_cost_type"]
 
         cost_per_piece = card_calc_cost_per_piece
         cost_order = 0.0
@@ -608,57 +699,90 @@ class CostEstimatorApp(tk.Frame):
         self.result_text.config(state="disabled")
 
         # Store for DB or PDF
-        self.calculated_data = {
-            "client_name": client_name,
-            "category": category,
-            "subcategory": subcat,
-            "quantity": qty_pieces,
-
-            "artwork_cost": aw_cost,
-            "artwork_cost_type": aw_type,
-            "width": w_val,
-            "length": l_val,
-            "material": mat,
-            "gsm": float(self.gsm_var.get() or 0) if mat == "Card & Board" else 0.0,
-            "card_calc_cost_per_piece": card_calc_cost_per_piece,
-            "card_calc_details": card_calc_details,
-
-            "front_colors": fCols,
-            "back_colors": bCols,
-            "printing_color_cost": pColorC,
-            "printing_color_cost_type": pColorType,
-
-            "foil_cost": foilC,
-            "foil_cost_type": foilT,
-            "screen_cost": screenC,
-            "screen_cost_type": screenT,
-            "heat_cost": heatC,
-            "heat_cost_type": heatT,
-            "emboss_cost": embossC,
-            "emboss_cost_type": embossT,
-
-            "coating": coat,
-            "coating_cost": coatC,
-            "coating_cost_type": coatT,
-
-            "cutting_cost": cutC,
-            "cutting_cost_type": cutT,
-
-            "total_cost_per_piece": total_cost_per_piece,
-            "total_cost_order": grand_total
-        }
+        self.calculated_data = Quote(
+            client_name=client_name,
+            category=category,
+            subcategory=subcat,
+            quantity=qty_pieces,
+
+            artwork_cost=aw_cost,
+            artwork_cost_type=aw_type,
+            width=w_val,
+            length=l_val,
+            material=mat,
+            gsm=v["gsm"] if mat == "Card & Board" else 0.0,
+            card_calc_cost_per_piece=card_calc_cost_per_piece,
+            card_calc_details=card_calc_details,
+
+            # Raw Card & Board inputs, kept so the quote can be re-priced later
+            sheet_w=card.get("sheet_w"),
+            sheet_l=card.get("sheet_l"),
+            gen=card.get("gen"),
+            kg_price=card.get("kg_price"),
+            freight=card.get("freight"),
+            sheet_pkt=card.get("sheet_pkt"),
+            prod_w=card.get("prod_w"),
+            prod_l=card.get("prod_l"),
+            card_qty=card.get("card_qty"),
+
+            front_colors=fCols,
+            back_colors=bCols,
+            printing_color_cost=pColorC,
+            printing_color_cost_type=pColorType,
+
+            foil_cost=foilC,
+            foil_cost_type=foilT,
+            screen_cost=screenC,
+            screen_cost_type=screenT,
+            heat_cost=heatC,
+            heat_cost_type=heatT,
+            emboss_cost=embossC,
+            emboss_cost_type=embossT,
+
+            coating=coat,
+            coating_cost=coatC,
+            coating_cost_type=coatT,
+
+            cutting_cost=cutC,
+            cutting_cost_type=cutT,
+
+            total_cost_per_piece=total_cost_per_piece,
+            total_cost_order=grand_total
+        )
 
         messagebox.showinfo("Calculated", f"Calculation done! Grand Total = {grand_total:.2f}")
 
     def save_record(self):
         """
-        Save the current cost data to the database.
+        Save the current cost data to the database, either as a new estimate
+        or as a revision of the estimate saved last.
         """
         if not hasattr(self, 'calculated_data'):
             messagebox.showerror("Error", "No calculation found. Please 'Calculate Cost' first.")
             return
 
-        row_id = database.save_cost_estimate(self.calculated_data)
+        if self.current_estimate_id is not None:
+            as_revision = messagebox.askyesnocancel(
+                "Save",
+                f"Save as a new revision of estimate ID={self.current_estimate_id}?\n"
+                "(No saves it as a separate estimate.)"
+            )
+            if as_revision is None:
+                return
+            if as_revision:
+                rev = revisions.save_revision(self.current_estimate_id, self.calculated_data)
+                # A confirmed order's board demand follows its latest revision
+                if procurement.is_confirmed(self.current_estimate_id):
+                    try:
+                        procurement.confirm_order(self.current_estimate_id, rev)
+                    except ValueError:
+                        procurement.release_order(self.current_estimate_id)
+                messagebox.showinfo("Saved", f"Revision {rev} of estimate ID={self.current_estimate_id} saved")
+                return
+
+        row_id = writer.save_cost_estimate(self.calculated_data)
+        self.current_estimate_id = row_id
+        self.client_index.add(self.calculated_data["client_name"])
         messagebox.showinfo("Saved", f"Record saved with ID={row_id}")
 
     def generate_pdf(self):
@@ -692,105 +816,120 @@ class CostEstimatorApp(tk.Frame):
 
         y = height - 2 * inch
 
-        # Final Cost Summary
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(inch, y, "Final Cost Summary:")
-        y -= 0.3 * inch
+        # Cost summary, Card & Board breakdown, additional specs, dimensions
+        reports.draw_pages(c, reports.layout_sections(reports.quote_sections(data), y))
 
-        c.setFont("Helvetica", 12)
-        lines = [
-            f"Quantity (pieces): {data['quantity']}",
-            f"Cost Per Piece: {data['total_cost_per_piece']:.4f}",
-            f"Grand Total: {data['total_cost_order']:.4f}",
-        ]
-        for line in lines:
-            c.drawString(inch, y, line)
-            y -= 0.25 * inch
-
-        y -= 0.2 * inch
-
-        # Card & Board details
-        if data["material"] == "Card & Board" and data["card_calc_details"]:
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(inch, y, "Card & Board Detailed Breakdown:")
-            y -= 0.3 * inch
+        c.showPage()
+        c.save()
 
-            c.setFont("Helvetica", 12)
-            detail_lines = data["card_calc_details"].split("\n")
-            for dl in detail_lines:
-                c.drawString(inch + 0.2 * inch, y, dl)
-                y -= 0.25 * inch
+        messagebox.showinfo("PDF Generated", f"PDF saved as {pdf_filename}")
 
-            y -= 0.2 * inch
+    def generate_quote_book(self):
+        """
+        Build one PDF of every saved quote for the client in the Client field.
+        """
+        client_name = self.client_name_var.get().strip()
+        if not client_name:
+            messagebox.showerror("Error", "Enter a client name first.")
+            return
 
-        # Additional Specs
-        c.setFont("Helvetica-Bold", 14)
-        c.drawString(inch, y, "Additional Specifications:")
-        y -= 0.3 * inch
+        try:
+            pdf_filename = reports.generate_quote_book(client_name)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
 
-        c.setFont("Helvetica", 12)
-        specs_list = []
+        messagebox.showinfo("PDF Generated", f"Quote book saved as {pdf_filename}")
 
-        # Artwork
-        if data['artwork_cost'] != 0:
-            specs_list.append(f"Artwork Cost: {data['artwork_cost']} ({data['artwork_cost_type']})")
+    def show_analysis(self):
+        """
+        Show sensitivities and add-on break-even quantities for the current
+        calculation below it in the result panel, replacing any earlier
+        analysis. For each per_order add-on a per_piece price can be entered
+        to get the quantity at which the two cost the same.
+        """
+        if not hasattr(self, 'calculated_data'):
+            messagebox.showerror("Error", "No calculation found. Please 'Calculate Cost' first.")
+            return
 
-        # Printing color
-        if data['printing_color_cost'] != 0:
-            specs_list.append(
-                f"Printing Color Cost: {data['printing_color_cost']} "
-                f"({data['printing_color_cost_type']})   "
-                f"Colors(Front={data['front_colors']}, Back={data['back_colors']})"
+        data = self.calculated_data
+        alternatives = {}
+        for cost, type_field in costing.ADD_ON_COSTS:
+            if data[type_field] != "per_order" or not data[cost]:
+                continue
+            label = cost.replace("_cost", "").replace("_", " ").capitalize()
+            price = simpledialog.askfloat(
+                "Price Drivers",
+                f"{label} is quoted per order at {data[cost]:g}.\n"
+                f"Per-piece price to compare it with (Cancel to skip):",
+                minvalue=0.0, parent=self.master
             )
+            if price is not None:
+                alternatives[cost] = price
 
-        if data['foil_cost'] != 0:
-            specs_list.append(f"Foil Cost: {data['foil_cost']} ({data['foil_cost_type']})")
-
-        if data['screen_cost'] != 0:
-            specs_list.append(f"Screen Cost: {data['screen_cost']} ({data['screen_cost_type']})")
-
-        if data['heat_cost'] != 0:
-            specs_list.append(f"Heat Cost: {data['heat_cost']} ({data['heat_cost_type']})")
-
-        if data['emboss_cost'] != 0:
-            specs_list.append(f"Emboss Cost: {data['emboss_cost']} ({data['emboss_cost_type']})")
-
-        if data['coating_cost'] != 0:
-            specs_list.append(f"Coating: {data['coating']} @ {data['coating_cost']} "
-                              f"({data['coating_cost_type']})")
-
-        if data['cutting_cost'] != 0:
-            specs_list.append(f"Cutting Cost: {data['cutting_cost']} ({data['cutting_cost_type']})")
+        self.result_text.config(state="normal")
+        if self.analysis_start is not None:
+            self.result_text.delete(self.analysis_start, tk.END)
+        self.analysis_start = self.result_text.index("end-1c")
+        self.result_text.insert(tk.END, "\n\n" + analysis.format_analysis(data, alternatives))
+        self.result_text.see(tk.END)
+        self.result_text.config(state="disabled")
 
-        if not specs_list:
-            specs_list.append("No Additional Specifications (all zero).")
+    def show_history(self):
+        """
+        Show every revision of an estimate with the fields each one changed.
+        """
+        estimate_id = simpledialog.askinteger(
+            "Quote History", "Estimate ID:", initialvalue=self.current_estimate_id, parent=self.master
+        )
+        if estimate_id is None:
+            return
 
-        for spec_line in specs_list:
-            c.drawString(inch + 0.2 * inch, y, spec_line)
-            y -= 0.25 * inch
+        try:
+            text = revisions.format_history(estimate_id)
+        except LookupError as e:
+            messagebox.showerror("Error", str(e))
+            return
 
-        y -= 0.3 * inch
+        win = tk.Toplevel(self.master)
+        win.title(f"Quote History - Estimate {estimate_id}")
+        history_text = tk.Text(win, width=90, height=30, wrap="none")
+        history_text.pack(fill="both", expand=True)
+        history_text.insert(tk.END, text)
+        history_text.config(state="disabled")
 
-        # If material != Card & Board, show basic dimension info
-        if data['material'] != "Card & Board":
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(inch, y, "Basic Dimensions:")
-            y -= 0.3 * inch
-            c.setFont("Helvetica", 12)
+    def confirm_order(self):
+        """
+        Confirm an estimate as an order, so its board counts towards purchasing.
+        """
+        estimate_id = simpledialog.askinteger(
+            "Confirm Order", "Estimate ID:", initialvalue=self.current_estimate_id, parent=self.master
+        )
+        if estimate_id is None:
+            return
 
-            dim_info = [
-                f"Width(in): {data['width']}",
-                f"Length(in): {data['length']}",
-                f"Material: {data['material']}"
-            ]
-            for di in dim_info:
-                c.drawString(inch + 0.2 * inch, y, di)
-                y -= 0.25 * inch
+        try:
+            order = procurement.confirm_order(estimate_id)
+        except (LookupError, ValueError) as e:
+            messagebox.showerror("Error", str(e))
+            return
 
-        c.showPage()
-        c.save()
+        messagebox.showinfo(
+            "Confirmed",
+            f"Estimate ID={estimate_id} confirmed: {order['packets']:.2f} packets of "
+            f"{order['gsm']:g} gsm {order['sheet_w']:g}x{order['sheet_l']:g}"
+        )
 
-        messagebox.showinfo("PDF Generated", f"PDF saved as {pdf_filename}")
+    def show_purchase_list(self):
+        """
+        Show board needed by confirmed orders against the stock on hand.
+        """
+        win = tk.Toplevel(self.master)
+        win.title("Board Purchase List")
+        plan_text = tk.Text(win, width=80, height=20, wrap="none", font=("Courier", 10))
+        plan_text.pack(fill="both", expand=True)
+        plan_text.insert(tk.END, procurement.format_purchase_list(procurement.purchase_list()))
+        plan_text.config(state="disabled")
 
 def run_app():
     root = tk.Tk()
@@ -1,9 +1,19 @@
 # main.py
+import logging
+
 import database
+import backup
 from gui import run_app
 
+# Seconds between automatic snapshots while the app is open
+BACKUP_INTERVAL = 3600
+LOG_FILE = "cost_estimator.log"
+
 def main():
+    logging.basicConfig(filename=LOG_FILE, level=logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
     database.init_db()
+    backup.BackupScheduler(BACKUP_INTERVAL, on_done=backup.log_report).start()
     run_app()
 
 if __name__ == "__main__":
@@ -0,0 +1,184 @@
+# pdfstream.py
+"""
+A minimal text-only PDF writer that streams each page to disk as soon as it
+is finished, for documents too long to hold in a reportlab Canvas (which
+keeps every page in memory until save()).
+
+It implements the subset of the Canvas API used by reports.draw_pages
+(setFont, drawString, drawRightString, drawCentredString, showPage,
+getPageNumber, save), plus internal links and a flat outline.
+
+Object numbers are derived from page numbers, so links and outline entries
+can point at pages that have not been written yet. Only the byte offset of
+each object is kept in memory.
+"""
+import zlib
+from array import array
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+_FONTS = {"Helvetica": b"F1", "Helvetica-Bold": b"F2"}
+
+# Fixed objects; pages start after them, three object numbers per page
+_CATALOG, _PAGES, _F1, _F2, _OUTLINES, _INFO = 1, 2, 3, 4, 5, 6
+_FIRST_PAGE_OBJ = 7
+
+
+def page_obj(page: int) -> int:
+    """Object number of a page dict (1-based page); +1 is its content stream, +2 its outline item."""
+    return _FIRST_PAGE_OBJ + 3 * (page - 1)
+
+
+def _pdf_string(text: str) -> bytes:
+    raw = text.replace("→", "->").encode("cp1252", "replace")
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _num(v: float) -> bytes:
+    return (b"%.2f" % v).rstrip(b"0").rstrip(b".")
+
+
+class StreamingPDF:
+    def __init__(self, filename: str, pagesize=A4, title: str = ""):
+        self.width, self.height = pagesize
+        self.title = title
+        self._f = open(filename, "wb")
+        self._offsets = array("Q")
+        self._page = 1
+        self._ops = []
+        self._links = []
+        self._font = ("Helvetica", 12)
+
+        # Outline items are written one behind, once the next item is known
+        self._outline_count = 0
+        self._outline_first = None
+        self._outline_prev = None
+        self._outline_pending = None
+
+        self._f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    # ---- Canvas subset ----
+
+    def getPageNumber(self) -> int:
+        return self._page
+
+    def setFont(self, name: str, size: float):
+        self._font = (name, size)
+        self._ops.append(b"/%s %s Tf" % (_FONTS[name], _num(size)))
+
+    def drawString(self, x: float, y: float, text: str):
+        self._ops.append(b"BT %s %s Td %s Tj ET" % (_num(x), _num(y), _pdf_string(text)))
+
+    def drawRightString(self, x: float, y: float, text: str):
+        self.drawString(x - stringWidth(text, *self._font), y, text)
+
+    def drawCentredString(self, x: float, y: float, text: str):
+        self.drawString(x - stringWidth(text, *self._font) / 2, y, text)
+
+    def showPage(self):
+        """
+        Write the current page out and start the next one.
+        """
+        pid = page_obj(self._page)
+        content = zlib.compress(b"\n".join(self._ops))
+        self._write_obj(pid + 1, b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream"
+                        % (len(content), content))
+
+        annots = b""
+        if self._links:
+            annots = b" /Annots [" + b" ".join(
+                b"<< /Type /Annot /Subtype /Link /Border [0 0 0] /Rect [%s] /Dest [%d 0 R /XYZ null null null] >>"
+                % (b" ".join(_num(v) for v in rect), page_obj(dest))
+                for rect, dest in self._links
+            ) + b"]"
+        self._write_obj(pid, (
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %s %s]"
+            b" /Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> >> /Contents %d 0 R%s >>"
+        ) % (_PAGES, _num(self.width), _num(self.height), _F1, _F2, pid + 1, annots))
+
+        self._page += 1
+        self._ops = []
+        self._links = []
+        self._font = ("Helvetica", 12)
+
+    def save(self):
+        if self._ops:
+            self.showPage()
+        pages = self._page - 1
+        self._flush_outline(None)
+
+        self._write_obj(_F1, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+        self._write_obj(_F2, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>")
+        if self._outline_count:
+            self._write_obj(_OUTLINES, b"<< /Type /Outlines /First %d 0 R /Last %d 0 R /Count %d >>"
+                            % (self._outline_first, self._outline_prev, self._outline_count))
+        else:
+            self._write_obj(_OUTLINES, b"<< /Type /Outlines /Count 0 >>")
+        self._write_obj(_INFO, b"<< /Title %s /Producer (Mosaic Vision Cost Estimator) >>" % _pdf_string(self.title))
+
+        # Page tree: the kids list is written in slices rather than built whole
+        self._offsets_set(_PAGES, self._f.tell())
+        self._f.write(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [" % (_PAGES, pages))
+        for start in range(1, pages + 1, 1000):
+            self._f.write(b" ".join(b"%d 0 R" % page_obj(p) for p in range(start, min(start + 1000, pages + 1))) + b" ")
+        self._f.write(b"] >>\nendobj\n")
+
+        self._write_obj(_CATALOG, b"<< /Type /Catalog /Pages %d 0 R /Outlines %d 0 R /PageMode /UseOutlines >>"
+                        % (_PAGES, _OUTLINES))
+
+        xref_at = self._f.tell()
+        size = len(self._offsets)
+        self._f.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for obj in range(1, size):
+            off = self._offsets[obj]
+            self._f.write(b"%010d 00000 n \n" % off if off else b"0000000000 00000 f \n")
+        self._f.write(b"trailer\n<< /Size %d /Root %d 0 R /Info %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                      % (size, _CATALOG, _INFO, xref_at))
+        self._f.close()
+
+    # ---- Links and outline ----
+
+    def linkToPage(self, rect, page: int):
+        """
+        Make rect (x1, y1, x2, y2) on the current page jump to `page`.
+        """
+        self._links.append((rect, page))
+
+    def addOutlineEntry(self, title: str, page: int = None):
+        """
+        Add a top-level bookmark for `page` (default: the current page).
+        At most one entry per page.
+        """
+        page = page or self._page
+        self._flush_outline(page_obj(page) + 2)
+        self._outline_pending = (page_obj(page) + 2, title, page)
+
+    def _flush_outline(self, next_id):
+        if self._outline_pending is None:
+            return
+        oid, title, page = self._outline_pending
+        extra = b""
+        if self._outline_prev is not None:
+            extra += b" /Prev %d 0 R" % self._outline_prev
+        if next_id is not None:
+            extra += b" /Next %d 0 R" % next_id
+        self._write_obj(oid, b"<< /Title %s /Parent %d 0 R /Dest [%d 0 R /XYZ null null null]%s >>"
+                        % (_pdf_string(title), _OUTLINES, page_obj(page), extra))
+
+        if self._outline_first is None:
+            self._outline_first = oid
+        self._outline_prev = oid
+        self._outline_count += 1
+        self._outline_pending = None
+
+    # ---- Low level ----
+
+    def _offsets_set(self, obj: int, offset: int):
+        if obj >= len(self._offsets):
+            self._offsets.extend([0] * (obj + 1 - len(self._offsets)))
+        self._offsets[obj] = offset
+
+    def _write_obj(self, obj: int, body: bytes):
+        self._offsets_set(obj, self._f.tell())
+        self._f.write(b"%d 0 obj\n%s\nendobj\n" % (obj, body))
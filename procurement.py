@@ -0,0 +1,194 @@
+# procurement.py
+"""
+Board purchasing for confirmed Card & Board orders.
+
+Confirming an estimate records the sheets and packets it needs in
+stock_orders. Triggers keep stock_demand as running totals per material,
+gsm and sheet size, so the purchase list is one small read: total packets
+rounded up to whole packets, against the packets on hand in paper_stock.
+
+Usage:
+    python procurement.py                       # purchase list
+    python procurement.py --confirm 42          # confirm estimate 42 (latest revision)
+    python procurement.py --release 42          # order delivered or cancelled
+    python procurement.py --stock 300 20x30 40  # 40 packets of 300 gsm 20x30 on hand
+    python procurement.py --rebuild             # recompute totals from stock_orders
+"""
+import argparse
+import math
+import sqlite3
+from datetime import datetime
+
+import costing
+import database
+import revisions
+import writer
+
+MATERIAL = "Card & Board"
+
+
+def confirm_order(estimate_id: int, revision: int = None) -> dict:
+    """
+    Count a Card & Board estimate (its latest revision, unless given) towards
+    board demand. Confirming again replaces the earlier confirmation.
+    Returns the order's material, gsm, sheet size, sheets and packets.
+    """
+    if revision is None:
+        revision = revisions.latest_revision(estimate_id)
+    q = revisions.get_revision(estimate_id, revision)
+    if q["material"] != MATERIAL:
+        raise ValueError(f"Estimate {estimate_id} is not a Card & Board estimate.")
+    inputs = costing.card_inputs(q)
+    if inputs is None:
+        raise ValueError("This estimate has no Card & Board inputs to plan from.")
+    card = costing.card_board_cost(**inputs)
+
+    order = {
+        "material": MATERIAL,
+        "gsm": card["gsm"],
+        "sheet_w": card["sheet_w"],
+        "sheet_l": card["sheet_l"],
+        "sheets": card["sheets_req"],
+        "packets": card["packets_req"],
+    }
+
+    def write(conn):
+        conn.execute("DELETE FROM stock_orders WHERE estimate_id = ?", (estimate_id,))
+        conn.execute('''
+            INSERT INTO stock_orders
+                (estimate_id, revision, confirmed_at, material, gsm, sheet_w, sheet_l, sheets, packets)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (estimate_id, revision, datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+              order["material"], order["gsm"], order["sheet_w"], order["sheet_l"],
+              order["sheets"], order["packets"]))
+
+    writer.transaction(write)
+    return order
+
+
+def release_order(estimate_id: int) -> bool:
+    """
+    Stop counting an order (delivered or cancelled). Returns False if it
+    wasn't confirmed.
+    """
+    return writer.transaction(
+        lambda conn: conn.execute("DELETE FROM stock_orders WHERE estimate_id = ?", (estimate_id,)).rowcount > 0
+    )
+
+
+def is_confirmed(estimate_id: int) -> bool:
+    conn = database.get_read_connection()
+    row = conn.execute("SELECT 1 FROM stock_orders WHERE estimate_id = ?", (estimate_id,)).fetchone()
+    conn.close()
+    return row is not None
+
+
+def set_stock(gsm: float, sheet_w: float, sheet_l: float, packets: int, material: str = MATERIAL):
+    """
+    Record the packets on hand of one board.
+    """
+    writer.transaction(lambda conn: conn.execute('''
+        INSERT OR REPLACE INTO paper_stock (material, gsm, sheet_w, sheet_l, packets, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (material, gsm, sheet_w, sheet_l, packets, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))))
+
+
+def purchase_list() -> list:
+    """
+    One dict per board with confirmed demand or stock on hand: material, gsm,
+    sheet_w, sheet_l, orders, sheets, packets_needed (rounded up), on_hand
+    and to_order.
+    """
+    conn = database.get_read_connection()
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute('''
+        SELECT d.material, d.gsm, d.sheet_w, d.sheet_l, d.orders, d.sheets, d.packets,
+               COALESCE(s.packets, 0) AS on_hand
+        FROM stock_demand d
+        LEFT JOIN paper_stock s USING (material, gsm, sheet_w, sheet_l)
+        UNION ALL
+        SELECT s.material, s.gsm, s.sheet_w, s.sheet_l, 0, 0.0, 0.0, s.packets
+        FROM paper_stock s
+        WHERE NOT EXISTS (SELECT 1 FROM stock_demand d
+                          WHERE d.material = s.material AND d.gsm = s.gsm
+                            AND d.sheet_w = s.sheet_w AND d.sheet_l = s.sheet_l)
+        ORDER BY 1, 2, 3, 4
+    ''').fetchall()
+    conn.close()
+
+    plan = []
+    for r in rows:
+        # Running totals pick up float noise; don't let it round up a whole packet
+        needed = math.ceil(round(r["packets"], 6))
+        plan.append({
+            "material": r["material"],
+            "gsm": r["gsm"],
+            "sheet_w": r["sheet_w"],
+            "sheet_l": r["sheet_l"],
+            "orders": r["orders"],
+            "sheets": r["sheets"],
+            "packets_needed": needed,
+            "on_hand": r["on_hand"],
+            "to_order": max(0, needed - r["on_hand"]),
+        })
+    return plan
+
+
+def rebuild_demand():
+    """
+    Recompute stock_demand from stock_orders, e.g. after restoring an old backup.
+    """
+    def write(conn):
+        conn.execute("DELETE FROM stock_demand")
+        conn.execute('''
+            INSERT INTO stock_demand
+            SELECT material, gsm, sheet_w, sheet_l, COUNT(*), SUM(sheets), SUM(packets)
+            FROM stock_orders
+            GROUP BY material, gsm, sheet_w, sheet_l
+        ''')
+
+    writer.transaction(write)
+
+
+def format_purchase_list(plan) -> str:
+    lines = [f"{'Board':<28}{'Orders':>8}{'Sheets':>12}{'Packets':>10}{'On hand':>10}{'To order':>10}"]
+    for p in plan:
+        board = f"{p['gsm']:g} gsm {p['sheet_w']:g}x{p['sheet_l']:g}"
+        lines.append(f"{board:<28}{p['orders']:>8}{p['sheets']:>12,.0f}{p['packets_needed']:>10}"
+                     f"{p['on_hand']:>10}{p['to_order']:>10}")
+    if not plan:
+        lines.append("No confirmed Card & Board orders.")
+    return "\n".join(lines)
+
+
+def _sheet_size(text: str):
+    w, _, l = text.lower().partition("x")
+    return float(w), float(l)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Board purchase list for confirmed Card & Board orders.")
+    parser.add_argument("--confirm", type=int, metavar="ESTIMATE_ID")
+    parser.add_argument("--revision", type=int, help="with --confirm: this revision instead of the latest")
+    parser.add_argument("--release", type=int, metavar="ESTIMATE_ID")
+    parser.add_argument("--stock", nargs=3, metavar=("GSM", "WxL", "PACKETS"), help="set packets on hand")
+    parser.add_argument("--rebuild", action="store_true", help="recompute demand totals from the orders")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    if args.confirm is not None:
+        order = confirm_order(args.confirm, args.revision)
+        print(f"Confirmed estimate {args.confirm}: {order['packets']:.3f} packets of "
+              f"{order['gsm']:g} gsm {order['sheet_w']:g}x{order['sheet_l']:g}")
+    if args.release is not None:
+        print("Released." if release_order(args.release) else "Not confirmed.")
+    if args.stock:
+        gsm, size, packets = args.stock
+        set_stock(float(gsm), *_sheet_size(size), int(packets))
+    if args.rebuild:
+        rebuild_demand()
+    print(format_purchase_list(purchase_list()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+# quote.py
+"""
+Compact quote records.
+
+Quote is a __slots__ record for one quote (what calculate_cost produces);
+QuoteBatch holds many quotes in one NumPy structured array for batch paths.
+Both hand the database a parameter tuple in INSERT_ESTIMATE_SQL column
+order, and both can be read with quote["field"], which is all the PDF
+layout in reports.py needs.
+"""
+from datetime import datetime
+from operator import attrgetter
+
+import numpy as np
+
+import costing
+
+# Column order of database.INSERT_ESTIMATE_SQL
+FIELDS = (
+    "client_name", "category", "subcategory", "quantity",
+    "artwork_cost", "artwork_cost_type",
+    "width", "length", "material", "gsm",
+    "card_calc_cost_per_piece", "card_calc_details",
+    "sheet_w", "sheet_l", "gen", "kg_price", "freight",
+    "sheet_pkt", "prod_w", "prod_l", "card_qty",
+    "front_colors", "back_colors", "printing_color_cost", "printing_color_cost_type",
+    "foil_cost", "foil_cost_type",
+    "screen_cost", "screen_cost_type",
+    "heat_cost", "heat_cost_type",
+    "emboss_cost", "emboss_cost_type",
+    "coating", "coating_cost", "coating_cost_type",
+    "cutting_cost", "cutting_cost_type",
+    "total_cost_per_piece", "total_cost_order",
+    "created_at",
+)
+
+_DEFAULTS = {
+    "client_name": "", "category": "", "subcategory": "", "quantity": 0,
+    "material": "", "card_calc_details": "", "coating": "None",
+    "front_colors": 0, "back_colors": 0, "created_at": None,
+    **{f: None for f in costing.CARD_INPUT_FIELDS if f != "gsm"},
+    **{type_field: "per_piece" for _, type_field in costing.ADD_ON_COSTS},
+}
+
+_FIELD_DEFAULTS = tuple((name, _DEFAULTS.get(name, 0.0)) for name in FIELDS)
+_FIELD_SET = frozenset(FIELDS)
+_get_params = attrgetter(*FIELDS)
+
+
+def _now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+class Quote:
+    """
+    One quote. Fields not given take the form's defaults (0, per_piece,
+    no Card & Board inputs).
+    """
+    __slots__ = FIELDS
+
+    def __init__(self, **fields):
+        if not _FIELD_SET.issuperset(fields):
+            raise TypeError(f"Unknown quote fields: {', '.join(set(fields) - _FIELD_SET)}")
+        get = fields.get
+        for name, default in _FIELD_DEFAULTS:
+            setattr(self, name, get(name, default))
+
+    def __getitem__(self, name):
+        try:
+            return getattr(self, name)
+        except AttributeError:
+            raise KeyError(name) from None
+
+    def __repr__(self):
+        return f"Quote(client_name={self.client_name!r}, total_cost_order={self.total_cost_order!r})"
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Build from a cost_estimates row (sqlite3.Row) or any mapping.
+        """
+        keys = set(row.keys())
+        return cls(**{name: row[name] for name in FIELDS if name in keys})
+
+    def to_params(self) -> tuple:
+        params = _get_params(self)
+        if params[-1] is None:
+            params = params[:-1] + (_now(),)
+        return params
+
+
+# ---------------- Batches ----------------
+
+# Text fields with few distinct values are stored as codes into a lookup table
+_CODED = ("client_name", "category", "subcategory", "material", "coating")
+_COST_FIELDS = tuple(cost for cost, _ in costing.ADD_ON_COSTS)
+_CARD_INPUTS = tuple(f for f in costing.CARD_INPUT_FIELDS if f != "gsm")
+
+DTYPE = np.dtype(
+    [(name, np.int32) for name in _CODED]
+    + [("quantity", np.int64),
+       ("front_colors", np.int16), ("back_colors", np.int16),
+       # bit i set: ADD_ON_COSTS[i] is per_order
+       ("per_order", np.uint8),
+       ("created_at", "datetime64[s]")]
+    + [(name, np.float64) for name in (
+        "width", "length", "gsm", "card_calc_cost_per_piece",
+        *_CARD_INPUTS, *_COST_FIELDS,
+        "total_cost_per_piece", "total_cost_order")]
+)
+
+
+def card_breakdown(sheet_w, sheet_l, gsm, gen, kg_price, freight, sheet_pkt, prod_w, prod_l, card_qty):
+    """
+    Every value costing.card_board_cost returns, as arrays over arrays of
+    inputs. Zero gen or sheet/pkt gives a NaN rate_piece rather than raising.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total_inches = sheet_w * sheet_l
+        inches_gsm = total_inches * gsm
+        w_sheet = inches_gsm / gen
+        price_pkt = w_sheet * kg_price + freight
+        price_sheet = price_pkt / sheet_pkt
+        tot_prod_sz = prod_w * prod_l
+        pq_sheet = np.where(tot_prod_sz != 0, total_inches / tot_prod_sz, 0.0)
+        sheets_req = np.where(pq_sheet != 0, card_qty / pq_sheet, 0.0)
+        packets_req = np.where(sheet_pkt != 0, sheets_req / sheet_pkt, 0.0)
+        rate_piece = np.where(pq_sheet != 0, price_sheet / pq_sheet, 0.0)
+        rate_inch = np.where(total_inches != 0, price_sheet / total_inches, 0.0)
+    return {
+        "sheet_w": sheet_w, "sheet_l": sheet_l, "total_inches": total_inches,
+        "gsm": gsm, "inches_gsm": inches_gsm, "gen": gen, "w_sheet": w_sheet,
+        "kg_price": kg_price, "freight": freight, "price_pkt": price_pkt,
+        "sheet_pkt": sheet_pkt, "price_sheet": price_sheet,
+        "prod_w": prod_w, "prod_l": prod_l, "tot_prod_sz": tot_prod_sz, "pq_sheet": pq_sheet,
+        "card_qty": card_qty, "sheets_req": sheets_req, "packets_req": packets_req,
+        "rate_piece": np.where((gen == 0) | (sheet_pkt == 0), np.nan, rate_piece),
+        "rate_inch": rate_inch,
+    }
+
+
+def card_rates(sheet_w, sheet_l, gsm, gen, kg_price, freight, sheet_pkt, prod_w, prod_l, card_qty=None):
+    """
+    Card & Board rate per piece (costing.card_board_cost's rate_piece) for
+    arrays of inputs. Zero gen or sheet/pkt gives NaN rather than raising.
+    """
+    return card_breakdown(sheet_w, sheet_l, gsm, gen, kg_price, freight, sheet_pkt,
+                          prod_w, prod_l, 0.0 if card_qty is None else card_qty)["rate_piece"]
+
+
+class QuoteBatch:
+    """
+    Many quotes in one structured array (about 200 bytes each, against
+    several KB for a dict per quote). Card & Board inputs that were not
+    given are NaN. card_calc_details is rebuilt from the inputs when a row
+    is written out; only rows saved before the inputs were stored keep
+    their text, in `details`.
+    """
+    def __init__(self, size: int = 0):
+        self.data = np.zeros(size, dtype=DTYPE)
+        self.data["created_at"] = np.datetime64("NaT")
+        for name in _CARD_INPUTS:
+            self.data[name] = np.nan
+        self.data["coating"] = 0
+        self.labels = {name: [] for name in _CODED}
+        self._codes = {name: {} for name in _CODED}
+        # row -> card_calc_details of Card & Board rows without their inputs
+        self.details = {}
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def nbytes(self) -> int:
+        return self.data[:self._len].nbytes + sum(
+            sum(len(s) for s in labels) for labels in self.labels.values()
+        )
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        A live view of one numeric column.
+        """
+        return self.data[name][:self._len]
+
+    def code(self, field: str, text: str) -> int:
+        codes = self._codes[field]
+        c = codes.get(text)
+        if c is None:
+            c = codes[text] = len(self.labels[field])
+            self.labels[field].append(text)
+        return c
+
+    def append(self, quote):
+        """
+        Add one Quote (or a mapping with the same keys).
+        """
+        self.extend((quote,))
+
+    def extend(self, quotes, chunk: int = 100000):
+        """
+        Add Quotes (or mappings with the same keys). Each chunk is transposed
+        into columns and written into the array a column at a time.
+        """
+        buf = []
+        for q in quotes:
+            buf.append(_get_params(q if isinstance(q, Quote) else Quote.from_row(q)))
+            if len(buf) == chunk:
+                self._add_rows(buf)
+                buf = []
+        if buf:
+            self._add_rows(buf)
+
+    def _add_rows(self, rows):
+        self.add_columns(dict(zip(FIELDS, zip(*rows))), len(rows))
+
+    def add_columns(self, cols: dict, n: int):
+        """
+        Add n quotes given as columns ({field: sequence of n values}, e.g.
+        from validation.validate_columns). Missing fields take the defaults.
+        """
+        while self._len + n > len(self.data):
+            self._grow()
+        out = self.data[self._len:self._len + n]
+
+        def col(name):
+            values = cols.get(name)
+            return [_DEFAULTS.get(name, 0.0)] * n if values is None else values
+
+        code = self.code
+        for name in _CODED:
+            out[name] = [code(name, v or "") for v in col(name)]
+        for name in ("quantity", "front_colors", "back_colors"):
+            out[name] = [v or 0 for v in col(name)]
+        for name in ("width", "length", "gsm", "card_calc_cost_per_piece",
+                     *_CARD_INPUTS, *_COST_FIELDS,
+                     "total_cost_per_piece", "total_cost_order"):
+            # None becomes NaN
+            out[name] = np.array(col(name), dtype=np.float64)
+        mask = np.zeros(n, dtype=np.uint8)
+        for bit, (_, type_field) in enumerate(costing.ADD_ON_COSTS):
+            mask |= (np.array(col(type_field)) == "per_order").astype(np.uint8) << bit
+        out["per_order"] = mask
+        out["created_at"] = np.array(col("created_at"), dtype="datetime64[s]")
+
+        # The stored text is the only copy of an older row's inputs
+        details = cols.get("card_calc_details")
+        card = self._codes["material"].get("Card & Board")
+        if details is not None and card is not None:
+            missing = np.zeros(n, dtype=bool)
+            for name in _CARD_INPUTS:
+                missing |= np.isnan(out[name])
+            for j in np.flatnonzero(missing & (out["material"] == card)).tolist():
+                if details[j]:
+                    self.details[self._len + j] = details[j]
+        self._len += n
+
+    def _grow(self):
+        old = self.data
+        self.data = np.zeros(max(16, 2 * len(old)), dtype=DTYPE)
+        self.data[:len(old)] = old
+        self.data["created_at"][len(old):] = np.datetime64("NaT")
+        for name in _CARD_INPUTS:
+            self.data[name][len(old):] = np.nan
+
+    def is_per_order(self, cost_field: str) -> np.ndarray:
+        bit = _COST_FIELDS.index(cost_field)
+        return (self.column("per_order") >> bit) & 1 == 1
+
+    def compute_card_rates(self):
+        """
+        Set card_calc_cost_per_piece of every Card & Board quote whose inputs
+        are all known, from those inputs.
+        """
+        card = self._codes["material"].get("Card & Board")
+        if card is None:
+            return
+        inputs = [self.column(name) for name in costing.CARD_INPUT_FIELDS]
+        rates = card_rates(*inputs)
+        known = (self.column("material") == card) & np.isfinite(rates)
+        for values in inputs:
+            known &= np.isfinite(values)
+        self.column("card_calc_cost_per_piece")[known] = rates[known]
+
+    def compute_totals(self):
+        """
+        Recompute total_cost_per_piece and total_cost_order for every quote
+        from the card rate and the add-on costs, as calculate_cost does.
+        """
+        per_piece = self.column("card_calc_cost_per_piece").copy()
+        per_order = np.zeros(self._len)
+        for cost in _COST_FIELDS:
+            values = self.column(cost)
+            order_mask = self.is_per_order(cost)
+            per_piece += np.where(order_mask, 0.0, values)
+            per_order += np.where(order_mask, values, 0.0)
+        self.column("total_cost_per_piece")[:] = per_piece
+        self.column("total_cost_order")[:] = per_piece * self.column("quantity") + per_order
+
+    def quote(self, i: int) -> Quote:
+        """
+        Row i as a Quote, e.g. for a PDF.
+        """
+        return Quote(**dict(zip(FIELDS, next(self.iter_params(i, i + 1)))))
+
+    def iter_params(self, start: int = 0, stop: int = None, chunk: int = 10000):
+        """
+        Yield a parameter tuple per quote, in FIELDS order, for executemany.
+        Columns are converted a chunk at a time; no per-quote dicts are built.
+        """
+        stop = self._len if stop is None else min(stop, self._len)
+        now = _now()
+        type_names = ("per_piece", "per_order")
+        for lo in range(start, stop, chunk):
+            part = self.data[lo:min(lo + chunk, stop)]
+            cols = {}
+            for name in _CODED:
+                labels = self.labels[name]
+                cols[name] = [labels[c] for c in part[name].tolist()]
+            for name in ("quantity", "front_colors", "back_colors", "width", "length", "gsm",
+                         "card_calc_cost_per_piece", *_COST_FIELDS,
+                         "total_cost_per_piece", "total_cost_order"):
+                cols[name] = part[name].tolist()
+            for name in _CARD_INPUTS:
+                cols[name] = [None if v != v else v for v in part[name].tolist()]
+            masks = part["per_order"].tolist()
+            for bit, (_, type_field) in enumerate(costing.ADD_ON_COSTS):
+                cols[type_field] = [type_names[(m >> bit) & 1] for m in masks]
+            cols["created_at"] = [
+                now if t is None else t.strftime("%Y-%m-%d %H:%M:%S")
+                for t in part["created_at"].astype(object).tolist()
+            ]
+            details = self.details
+            cols["card_calc_details"] = [
+                details[lo + j] if lo + j in details
+                else _card_details(cols, j) if cols["material"][j] == "Card & Board" else ""
+                for j in range(len(part))
+            ]
+            yield from zip(*(cols[name] for name in FIELDS))
+
+
+def card_details(inputs) -> str:
+    """
+    card_calc_details for the Card & Board inputs, in CARD_INPUT_FIELDS
+    order, or "" if any are missing or invalid.
+    """
+    if None in inputs:
+        return ""
+    try:
+        return costing.card_board_details(costing.card_board_cost(*inputs))
+    except ValueError:
+        return ""
+
+
+def _card_details(cols, j) -> str:
+    return card_details([cols[name][j] for name in costing.CARD_INPUT_FIELDS])
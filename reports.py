@@ -0,0 +1,281 @@
+# reports.py
+"""
+PDF layout shared by the single-quote report and the per-client quote book.
+
+Usage:
+    python reports.py "Client Name" [-o QuoteBook.pdf]
+
+The quote book streams a client's estimates from the database twice (table
+of contents, then quote pages) and writes each page to disk as it goes, so
+memory stays flat however many quotes the client has.
+"""
+import argparse
+import math
+from datetime import datetime
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+
+import database
+from pdfstream import StreamingPDF
+
+PAGE_W, PAGE_H = A4
+TOP = PAGE_H - 1 * inch
+BOTTOM = 0.75 * inch
+LINE = 0.25 * inch
+HEADING = 0.3 * inch
+
+TOC_ROWS_PER_PAGE = 40
+
+
+def quote_sections(data):
+    """
+    The body of a quote report as (heading, lines, indent, space_after) tuples.
+    `data` is a calculated_data dict or a cost_estimates row.
+    """
+    sections = []
+
+    # Final Cost Summary
+    sections.append(("Final Cost Summary:", [
+        f"Quantity (pieces): {data['quantity']}",
+        f"Cost Per Piece: {data['total_cost_per_piece']:.4f}",
+        f"Grand Total: {data['total_cost_order']:.4f}",
+    ], 0, 0.2 * inch))
+
+    # Card & Board details
+    if data["material"] == "Card & Board" and data["card_calc_details"]:
+        sections.append(("Card & Board Detailed Breakdown:",
+                         data["card_calc_details"].split("\n"), 0.2 * inch, 0.2 * inch))
+
+    # Additional Specs
+    specs_list = []
+
+    # Artwork
+    if data['artwork_cost'] != 0:
+        specs_list.append(f"Artwork Cost: {data['artwork_cost']} ({data['artwork_cost_type']})")
+
+    # Printing color
+    if data['printing_color_cost'] != 0:
+        specs_list.append(
+            f"Printing Color Cost: {data['printing_color_cost']} "
+            f"({data['printing_color_cost_type']})   "
+            f"Colors(Front={data['front_colors']}, Back={data['back_colors']})"
+        )
+
+    if data['foil_cost'] != 0:
+        specs_list.append(f"Foil Cost: {data['foil_cost']} ({data['foil_cost_type']})")
+
+    if data['screen_cost'] != 0:
+        specs_list.append(f"Screen Cost: {data['screen_cost']} ({data['screen_cost_type']})")
+
+    if data['heat_cost'] != 0:
+        specs_list.append(f"Heat Cost: {data['heat_cost']} ({data['heat_cost_type']})")
+
+    if data['emboss_cost'] != 0:
+        specs_list.append(f"Emboss Cost: {data['emboss_cost']} ({data['emboss_cost_type']})")
+
+    if data['coating_cost'] != 0:
+        specs_list.append(f"Coating: {data['coating']} @ {data['coating_cost']} "
+                          f"({data['coating_cost_type']})")
+
+    if data['cutting_cost'] != 0:
+        specs_list.append(f"Cutting Cost: {data['cutting_cost']} ({data['cutting_cost_type']})")
+
+    if not specs_list:
+        specs_list.append("No Additional Specifications (all zero).")
+
+    sections.append(("Additional Specifications:", specs_list, 0.2 * inch, 0.3 * inch))
+
+    # If material != Card & Board, show basic dimension info
+    if data['material'] != "Card & Board":
+        sections.append(("Basic Dimensions:", [
+            f"Width(in): {data['width']}",
+            f"Length(in): {data['length']}",
+            f"Material: {data['material']}"
+        ], 0.2 * inch, 0))
+
+    return sections
+
+
+def layout_sections(sections, y):
+    """
+    Place sections from height y downwards, breaking onto new pages as needed.
+    Returns a list of pages, each a list of (font, size, x, y, text).
+    """
+    pages = [[]]
+    for heading, lines, indent, space_after in sections:
+        # Keep a heading together with at least its first line
+        if y - HEADING - LINE < BOTTOM:
+            pages.append([])
+            y = TOP
+        pages[-1].append(("Helvetica-Bold", 14, inch, y, heading))
+        y -= HEADING
+
+        for line in lines:
+            if y < BOTTOM:
+                pages.append([])
+                y = TOP
+            pages[-1].append(("Helvetica", 12, inch + indent, y, line))
+            y -= LINE
+
+        y -= space_after
+    return pages
+
+
+def draw_page(c, items):
+    """
+    Draw one laid-out page on a reportlab Canvas or a StreamingPDF.
+    """
+    for font, size, x, y, text in items:
+        c.setFont(font, size)
+        c.drawString(x, y, text)
+
+
+def draw_pages(c, pages):
+    """
+    Draw laid-out pages, starting on the current page.
+    The caller ends the last page.
+    """
+    for i, items in enumerate(pages):
+        if i:
+            c.showPage()
+        draw_page(c, items)
+
+
+# ---------------- Quote book ----------------
+
+QUOTE_BODY_TOP = PAGE_H - 1.7 * inch
+
+
+def _quote_pages(row):
+    return layout_sections(quote_sections(row), QUOTE_BODY_TOP)
+
+
+def _quote_title(row):
+    return f"Quote #{row['id']}: {row['category']} → {row['subcategory']}"
+
+
+def _draw_cover(c, client_name, summary, quote_count):
+    c.setFont("Helvetica-Bold", 20)
+    c.drawCentredString(PAGE_W / 2, PAGE_H - 1 * inch, "Mosaic Vision Quote Book")
+    c.setFont("Helvetica", 12)
+    c.drawCentredString(PAGE_W / 2, PAGE_H - 1.4 * inch, f"Client: {client_name}")
+    c.drawCentredString(PAGE_W / 2, PAGE_H - 1.65 * inch,
+                        f"{quote_count} quotes, generated {datetime.now().strftime('%Y-%m-%d %H:%M')}")
+
+    y = PAGE_H - 2.3 * inch
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(inch, y, "Summary:")
+    y -= HEADING
+
+    cols = (inch, 4.2 * inch, 5.2 * inch, 6.3 * inch)
+    c.setFont("Helvetica-Bold", 11)
+    for x, head in zip(cols, ("Category → Subcategory", "Quotes", "Pieces", "Grand Total")):
+        c.drawString(x, y, head)
+    y -= LINE
+
+    c.setFont("Helvetica", 11)
+    totals = [0, 0, 0.0]
+    for category, subcategory, count, pieces, amount in summary:
+        if y < BOTTOM + LINE:
+            c.showPage()
+            c.setFont("Helvetica", 11)
+            y = TOP
+        c.drawString(cols[0], y, f"{category or '-'} → {subcategory or '-'}")
+        c.drawRightString(cols[1] + 0.5 * inch, y, str(count))
+        c.drawRightString(cols[2] + 0.6 * inch, y, str(pieces or 0))
+        c.drawRightString(cols[3] + 0.9 * inch, y, f"{amount or 0:,.2f}")
+        totals[0] += count
+        totals[1] += pieces or 0
+        totals[2] += amount or 0
+        y -= LINE
+
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(cols[0], y, "Total")
+    c.drawRightString(cols[1] + 0.5 * inch, y, str(totals[0]))
+    c.drawRightString(cols[2] + 0.6 * inch, y, str(totals[1]))
+    c.drawRightString(cols[3] + 0.9 * inch, y, f"{totals[2]:,.2f}")
+    c.showPage()
+
+
+def generate_quote_book(client_name: str, pdf_filename: str = None) -> str:
+    """
+    Write every saved estimate for one client into a single PDF: cover page
+    with a per-product summary table, a linked table of contents, then one
+    or more pages per quote. Returns the file name.
+    """
+    if pdf_filename is None:
+        safe = "".join(ch if ch.isalnum() else "_" for ch in client_name).strip("_") or "client"
+        pdf_filename = f"QuoteBook_{safe}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+    # The summary and both passes read one snapshot of the hot database, so
+    # an estimate saved meanwhile can't shift the contents' page numbers
+    conn = database.get_read_connection()
+    try:
+        conn.execute("BEGIN")
+        _write_quote_book(conn, client_name, pdf_filename)
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return pdf_filename
+
+
+def _write_quote_book(conn, client_name: str, pdf_filename: str):
+    summary = database.get_client_summary(client_name, conn)
+    quote_count = sum(row[2] for row in summary)
+    if not quote_count:
+        raise ValueError(f"No saved estimates for client '{client_name}'.")
+
+    # Pages go to disk as they are finished; see pdfstream.py
+    c = StreamingPDF(pdf_filename, A4, title=f"Quote Book - {client_name}")
+
+    _draw_cover(c, client_name, summary, quote_count)
+
+    # Table of contents: page numbers come from laying each quote out
+    # without drawing it
+    toc_first = c.getPageNumber()
+    page = toc_first + math.ceil(quote_count / TOC_ROWS_PER_PAGE)
+    c.addOutlineEntry("Contents")
+    for i, row in enumerate(database.iter_client_estimates(client_name, conn)):
+        if i and i % TOC_ROWS_PER_PAGE == 0:
+            c.showPage()
+        if i % TOC_ROWS_PER_PAGE == 0:
+            c.setFont("Helvetica-Bold", 14)
+            c.drawString(inch, TOP, "Contents" if i == 0 else "Contents (cont.)")
+            c.setFont("Helvetica", 10)
+        y = TOP - HEADING - (i % TOC_ROWS_PER_PAGE) * 0.22 * inch
+
+        c.drawString(inch, y, _quote_title(row))
+        c.drawRightString(PAGE_W - 1.6 * inch, y, f"{row['total_cost_order']:,.2f}")
+        c.drawRightString(PAGE_W - inch, y, str(page))
+        c.linkToPage((inch, y - 2, PAGE_W - inch, y + 10), page)
+        page += len(_quote_pages(row))
+    c.showPage()
+
+    # Quote pages
+    for row in database.iter_client_estimates(client_name, conn):
+        c.addOutlineEntry(_quote_title(row))
+
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(inch, PAGE_H - 1 * inch, _quote_title(row))
+        c.setFont("Helvetica", 11)
+        c.drawString(inch, PAGE_H - 1.3 * inch, f"Client: {row['client_name']}   Material: {row['material'] or '-'}")
+
+        draw_pages(c, _quote_pages(row))
+        c.showPage()
+
+    c.save()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a client's quote book PDF.")
+    parser.add_argument("client_name")
+    parser.add_argument("-o", "--output", help="PDF file name")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    print(f"PDF saved as {generate_quote_book(args.client_name, args.output)}")
+
+
+if __name__ == "__main__":
+    main()
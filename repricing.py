@@ -0,0 +1,255 @@
+# repricing.py
+"""
+Re-price saved Card & Board estimates after a change in board kg prices.
+
+Usage:
+    python repricing.py --rate 300=410 --rate 350=425 --report deltas.csv
+
+Only estimates whose gsm appears in the new rate set and whose stored
+kg price differs from the new one are read and rewritten.
+"""
+import argparse
+import csv
+import math
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import costing
+import database
+import writer
+from quote import card_breakdown
+
+CHUNK_SIZE = 500
+
+# Names of row[3:14] of _SELECT_AFFECTED, for costing.card_inputs
+_INPUT_COLUMNS = costing.CARD_INPUT_FIELDS + ("card_calc_details",)
+
+_SELECT_AFFECTED = '''
+    SELECT e.id, e.client_name, e.quantity,
+           e.sheet_w, e.sheet_l, e.gsm, e.gen, e.kg_price, e.freight,
+           e.sheet_pkt, e.prod_w, e.prod_l, e.card_qty,
+           e.card_calc_details, e.card_calc_cost_per_piece,
+           e.total_cost_per_piece, e.total_cost_order,
+           COALESCE(e.price_version, 1),
+           r.kg_price
+    FROM cost_estimates e
+    JOIN temp.new_rates r ON r.gsm = e.gsm
+    WHERE e.material = 'Card & Board'
+      AND (e.kg_price IS NULL OR e.kg_price != r.kg_price)
+      AND e.id > ?
+    ORDER BY e.id
+    LIMIT ?
+'''
+
+
+def iter_affected(conn, rates: dict, chunk_size: int = CHUNK_SIZE):
+    """
+    Yield lists of affected estimate rows, at most chunk_size at a time.
+    Rows are paged by id, so memory stays flat however large the table is.
+    """
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS new_rates (gsm REAL PRIMARY KEY, kg_price REAL)")
+    conn.execute("DELETE FROM temp.new_rates")
+    conn.executemany("INSERT INTO temp.new_rates VALUES (?, ?)", rates.items())
+
+    last_id = 0
+    while True:
+        rows = conn.execute(_SELECT_AFFECTED, (last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def reprice_rows(rows) -> list:
+    """
+    Recompute one chunk of estimate rows at their new kg prices, the board
+    costs for the whole chunk at once with quote.card_breakdown.
+    Returns a result dict per row, or None where the Card & Board inputs
+    can't be recovered.
+    """
+    results = [None] * len(rows)
+    todo, inputs = [], []
+    for i, row in enumerate(rows):
+        found = costing.card_inputs(dict(zip(_INPUT_COLUMNS, row[3:14])))
+        if found is not None and found["kg_price"] != row[18]:
+            todo.append(i)
+            inputs.append(found)
+    if not todo:
+        return results
+
+    cols = {name: np.array([inp[name] for inp in inputs], dtype=float) for name in costing.CARD_INPUT_FIELDS}
+    cols["gsm"] = np.array([rows[i][5] for i in todo], dtype=float)
+    cols["kg_price"] = np.array([rows[i][18] for i in todo], dtype=float)
+    card = card_breakdown(*(cols[name] for name in costing.CARD_INPUT_FIELDS))
+
+    # Only the board component moves; add-ons are unchanged
+    old_card_cpp = np.array([rows[i][14] or 0 for i in todo], dtype=float)
+    old_cpp = np.array([rows[i][15] or 0 for i in todo], dtype=float)
+    old_total = np.array([rows[i][16] or 0 for i in todo], dtype=float)
+    qty = np.array([rows[i][2] or 0 for i in todo], dtype=float)
+    new_cpp = old_cpp - old_card_cpp + card["rate_piece"]
+    new_total = (old_total + (new_cpp - old_cpp) * qty).tolist()
+    new_cpp = new_cpp.tolist()
+
+    # Back to Python floats, so the details text reads as card_board_details' always has
+    names = list(card)
+    per_row = zip(*(values.tolist() for values in card.values()))
+    for i, inp, values, cpp, total in zip(todo, inputs, per_row, new_cpp, new_total):
+        breakdown = dict(zip(names, values))
+        if math.isnan(breakdown["rate_piece"]):
+            # Zero gen or sheet/pkt
+            continue
+        row = rows[i]
+        results[i] = {
+            "id": row[0],
+            "client_name": row[1],
+            "gsm": row[5],
+            "inputs": (inp["sheet_w"], inp["sheet_l"], inp["gen"], inp["freight"],
+                       inp["sheet_pkt"], inp["prod_w"], inp["prod_l"], inp["card_qty"]),
+            "old_kg_price": inp["kg_price"],
+            "new_kg_price": row[18],
+            "card_calc_cost_per_piece": breakdown["rate_piece"],
+            "card_calc_details": costing.card_board_details(breakdown),
+            "old_total_cost_per_piece": row[15],
+            "new_total_cost_per_piece": cpp,
+            "old_total_cost_order": row[16],
+            "new_total_cost_order": total,
+            "price_version": row[17] + 1,
+        }
+    return results
+
+
+def write_results(results):
+    """
+    Write one chunk of re-priced estimates back in a single transaction,
+    through the writer queue.
+    """
+    now_str = datetime.now().isoformat(timespec="seconds")
+
+    def write(conn):
+        conn.executemany('''
+            UPDATE cost_estimates
+            SET sheet_w = ?, sheet_l = ?, gen = ?, freight = ?,
+                sheet_pkt = ?, prod_w = ?, prod_l = ?, card_qty = ?,
+                kg_price = ?, card_calc_cost_per_piece = ?, card_calc_details = ?,
+                total_cost_per_piece = ?, total_cost_order = ?, price_version = ?
+            WHERE id = ?
+        ''', [
+            (*r["inputs"],
+             r["new_kg_price"], r["card_calc_cost_per_piece"], r["card_calc_details"],
+             r["new_total_cost_per_piece"], r["new_total_cost_order"], r["price_version"],
+             r["id"])
+            for r in results
+        ])
+        conn.executemany('''
+            INSERT INTO cost_estimate_reprices (
+                estimate_id, price_version, repriced_at,
+                old_kg_price, new_kg_price,
+                old_total_cost_per_piece, new_total_cost_per_piece,
+                old_total_cost_order, new_total_cost_order
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (r["id"], r["price_version"], now_str,
+             r["old_kg_price"], r["new_kg_price"],
+             r["old_total_cost_per_piece"], r["new_total_cost_per_piece"],
+             r["old_total_cost_order"], r["new_total_cost_order"])
+            for r in results
+        ])
+
+    writer.transaction(write)
+
+
+def reprice(rates: dict, chunk_size: int = CHUNK_SIZE, workers: int = None, dry_run: bool = False, report=None):
+    """
+    Re-price every affected estimate against the new rates (gsm -> kg price).
+    Each chunk is recomputed in one go, in-process unless `workers` > 1
+    asks for a process pool, and written back in one transaction. Returns
+    a summary dict; per-estimate deltas go to `report` (an open text file)
+    as CSV if given.
+    """
+    summary = {"repriced": 0, "skipped": 0, "old_total": 0.0, "new_total": 0.0}
+
+    writer = None
+    if report is not None:
+        writer = csv.writer(report)
+        writer.writerow([
+            "id", "client_name", "gsm", "old_kg_price", "new_kg_price",
+            "old_cost_per_piece", "new_cost_per_piece",
+            "old_grand_total", "new_grand_total", "delta"
+        ])
+
+    # Reads only; writes go through the writer queue
+    conn = database.get_read_connection()
+    pool = ProcessPoolExecutor(max_workers=workers) if workers and workers > 1 else None
+    try:
+        for rows in iter_affected(conn, rates, chunk_size):
+            if pool is not None:
+                step = -(-len(rows) // workers)
+                parts = pool.map(reprice_rows, [rows[k:k + step] for k in range(0, len(rows), step)])
+                results = [r for part in parts for r in part]
+            else:
+                results = reprice_rows(rows)
+
+            done = [r for r in results if r is not None]
+            summary["skipped"] += len(results) - len(done)
+            if not done:
+                continue
+
+            if not dry_run:
+                write_results(done)
+
+            for r in done:
+                summary["repriced"] += 1
+                summary["old_total"] += r["old_total_cost_order"] or 0
+                summary["new_total"] += r["new_total_cost_order"]
+                if writer is not None:
+                    writer.writerow([
+                        r["id"], r["client_name"], r["gsm"], r["old_kg_price"], r["new_kg_price"],
+                        f"{r['old_total_cost_per_piece'] or 0:.4f}", f"{r['new_total_cost_per_piece']:.4f}",
+                        f"{r['old_total_cost_order'] or 0:.4f}", f"{r['new_total_cost_order']:.4f}",
+                        f"{r['new_total_cost_order'] - (r['old_total_cost_order'] or 0):.4f}"
+                    ])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        conn.close()
+
+    summary["delta"] = summary["new_total"] - summary["old_total"]
+    return summary
+
+
+def _parse_rate(text):
+    gsm, _, price = text.partition("=")
+    return float(gsm), float(price)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-price saved Card & Board estimates.")
+    parser.add_argument("--rate", action="append", type=_parse_rate, required=True,
+                        metavar="GSM=KG_PRICE", help="new kg price for a gsm (repeatable)")
+    parser.add_argument("--report", help="write a per-estimate before/after CSV here")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="recompute chunks across this many processes (default: in-process)")
+    parser.add_argument("--dry-run", action="store_true", help="compute the report without writing")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    rates = dict(args.rate)
+
+    if args.report:
+        with open(args.report, "w", newline="") as f:
+            summary = reprice(rates, args.chunk_size, args.workers, args.dry_run, f)
+    else:
+        summary = reprice(rates, args.chunk_size, args.workers, args.dry_run)
+
+    print(f"Re-priced: {summary['repriced']}  Skipped: {summary['skipped']}")
+    print(f"Grand totals before: {summary['old_total']:.2f}  after: {summary['new_total']:.2f}  "
+          f"delta: {summary['delta']:+.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+# revisions.py
+"""
+Quote revisions.
+
+Revising a saved estimate appends a row to cost_estimate_revisions holding
+only the fields that changed against its parent revision, as JSON.
+Revision 0 is the cost_estimates row as it was when the estimate was first
+revised, frozen there as a full copy. Every SNAPSHOT_EVERY revisions down a
+chain a full copy is stored instead, so rebuilding any revision replays at
+most that many deltas.
+
+Usage:
+    python revisions.py ESTIMATE_ID               # history with diffs
+    python revisions.py ESTIMATE_ID --revision 3  # one revision in full
+"""
+import argparse
+import json
+import sqlite3
+from datetime import datetime
+
+import archive
+import costing
+import database
+import writer
+from quote import FIELDS, Quote, card_details
+
+SNAPSHOT_EVERY = 8
+
+# created_at belongs to the revision row; card_calc_details is rebuilt from
+# the Card & Board inputs unless it can't be (see diff)
+_CONTENT = tuple(name for name in FIELDS if name != "created_at")
+_CARD_TRIGGERS = frozenset(costing.CARD_INPUT_FIELDS) | {"material"}
+
+
+def _rebuild_details(state: dict) -> str:
+    if state["material"] != "Card & Board":
+        return ""
+    return card_details([state[name] for name in costing.CARD_INPUT_FIELDS])
+
+
+def diff(old: dict, new: dict) -> dict:
+    """
+    The fields of `new` that differ from `old`, as stored in a delta.
+    card_calc_details is left out when apply() would rebuild it anyway.
+    """
+    delta = {name: new[name] for name in _CONTENT
+             if name != "card_calc_details" and new[name] != old[name]}
+    if _CARD_TRIGGERS.intersection(delta):
+        expected = _rebuild_details(new)
+    else:
+        expected = old["card_calc_details"]
+    if new["card_calc_details"] != expected:
+        delta["card_calc_details"] = new["card_calc_details"]
+    return delta
+
+
+def apply(state: dict, delta: dict) -> dict:
+    """
+    The state after a delta, as a new dict.
+    """
+    new = {**state, **delta}
+    if "card_calc_details" not in delta and _CARD_TRIGGERS.intersection(delta):
+        new["card_calc_details"] = _rebuild_details(new)
+    return new
+
+
+def _snapshot(state: dict) -> dict:
+    fields = dict(state)
+    if fields["card_calc_details"] == _rebuild_details(state):
+        del fields["card_calc_details"]
+    return fields
+
+
+def _from_snapshot(fields: dict) -> dict:
+    if "card_calc_details" not in fields:
+        fields["card_calc_details"] = _rebuild_details(fields)
+    return fields
+
+
+def _state(data) -> dict:
+    return {name: data[name] for name in _CONTENT}
+
+
+def _base(conn, estimate_id: int) -> sqlite3.Row:
+    row = conn.execute("SELECT * FROM cost_estimates WHERE id = ?", (estimate_id,)).fetchone()
+    if row is None:
+        # Archived estimates keep their revisions in the hot database
+        rows = list(archive.iter_history(
+            None, "SELECT * FROM cost_estimates WHERE id = ?", (estimate_id,), row_factory=sqlite3.Row
+        ))
+        row = rows[0] if rows else None
+    if row is None:
+        raise LookupError(f"No estimate with ID={estimate_id}.")
+    return row
+
+
+_CHAIN_SQL = '''
+    WITH RECURSIVE chain(revision, parent_revision, is_snapshot, fields, created_at, depth) AS (
+        SELECT revision, parent_revision, is_snapshot, fields, created_at, depth
+        FROM cost_estimate_revisions WHERE estimate_id = :id AND revision = :revision
+        UNION ALL
+        SELECT r.revision, r.parent_revision, r.is_snapshot, r.fields, r.created_at, r.depth
+        FROM cost_estimate_revisions r JOIN chain c
+            ON r.estimate_id = :id AND r.revision = c.parent_revision
+        WHERE c.is_snapshot = 0
+    )
+    SELECT revision, parent_revision, is_snapshot, fields, created_at, depth FROM chain
+'''
+
+
+def _latest(conn, estimate_id: int) -> int:
+    return conn.execute(
+        "SELECT COALESCE(MAX(revision), 0) FROM cost_estimate_revisions WHERE estimate_id = ?",
+        (estimate_id,)
+    ).fetchone()[0]
+
+
+def latest_revision(estimate_id: int) -> int:
+    """
+    The newest revision number of an estimate (0 if it was never revised).
+    """
+    conn = database.get_read_connection()
+    try:
+        return _latest(conn, estimate_id)
+    finally:
+        conn.close()
+
+
+def _load(conn, estimate_id: int, revision: int, base=None):
+    """
+    (state, created_at, depth) of one revision, replaying its delta chain.
+    base is the cost_estimates row if the caller has already read it.
+    """
+    chain = conn.execute(_CHAIN_SQL, {"id": estimate_id, "revision": revision}).fetchall()
+    if not chain:
+        if revision != 0:
+            raise LookupError(f"Estimate {estimate_id} has no revision {revision}.")
+        # Never revised: revision 0 is the live row
+        if base is None:
+            base = _base(conn, estimate_id)
+        return _state(base), base["created_at"], 0
+
+    # chain runs newest first and ends at a snapshot (revision 0 once
+    # frozen) or, for estimates revised before that, at a child of revision 0
+    if chain[-1][2]:
+        state = _from_snapshot(json.loads(chain[-1][3]))
+        deltas = chain[-2::-1]
+    else:
+        state = _state(base if base is not None else _base(conn, estimate_id))
+        deltas = chain[::-1]
+    for row in deltas:
+        state = apply(state, json.loads(row[3]))
+    return state, chain[0][4], chain[0][5]
+
+
+def get_revision(estimate_id: int, revision: int = None) -> Quote:
+    """
+    One revision of an estimate as a Quote; the latest if revision is None.
+    """
+    conn = database.get_read_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        if revision is None:
+            revision = _latest(conn, estimate_id)
+        state, created_at, _ = _load(conn, estimate_id, revision)
+    finally:
+        conn.close()
+    return Quote(**state, created_at=created_at)
+
+
+def save_revision(estimate_id: int, data, parent_revision: int = None, note: str = None) -> int:
+    """
+    Append `data` (a Quote or dict) as a revision of an estimate, stored as
+    its delta against parent_revision (the latest if None).
+    Returns the new revision number.
+    """
+    # Read here, not in the write transaction: an archived estimate needs its year ATTACHed
+    conn = database.get_read_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        base = _base(conn, estimate_id)
+    finally:
+        conn.close()
+    new = _state(data)
+
+    def write(conn):
+        # Re-pricing and client merges rewrite the cost_estimates row in
+        # place, so the first revision freezes it as revision 0 for the
+        # deltas to replay onto
+        frozen = conn.execute(
+            "SELECT 1 FROM cost_estimate_revisions WHERE estimate_id = ? AND revision = 0", (estimate_id,)
+        ).fetchone()
+        if not frozen:
+            row = conn.execute("SELECT * FROM cost_estimates WHERE id = ?", (estimate_id,)).fetchone()
+            original = row if row is not None else base
+            conn.execute('''
+                INSERT INTO cost_estimate_revisions
+                    (estimate_id, revision, parent_revision, depth, is_snapshot, fields, note, created_at)
+                VALUES (?, 0, 0, 0, 1, ?, 'original estimate', ?)
+            ''', (estimate_id, json.dumps(_snapshot(_state(original)), separators=(",", ":")),
+                  original["created_at"]))
+
+        latest = _latest(conn, estimate_id)
+        parent = latest if parent_revision is None else parent_revision
+        parent_state, _, depth = _load(conn, estimate_id, parent, base)
+
+        if depth + 1 >= SNAPSHOT_EVERY:
+            is_snapshot, depth, fields = 1, 0, _snapshot(new)
+        else:
+            is_snapshot, depth, fields = 0, depth + 1, diff(parent_state, new)
+
+        conn.execute('''
+            INSERT INTO cost_estimate_revisions
+                (estimate_id, revision, parent_revision, depth, is_snapshot, fields, note, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (estimate_id, latest + 1, parent, depth, is_snapshot,
+              json.dumps(fields, separators=(",", ":")), note,
+              datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+        return latest + 1
+
+    return writer.transaction(write)
+
+
+def history(estimate_id: int) -> list:
+    """
+    Every revision of an estimate, oldest first, as dicts with revision,
+    parent_revision, created_at, note, is_snapshot, stored_bytes and
+    changes ({field: (old, new)} against the parent).
+    """
+    conn = database.get_read_connection()
+    conn.row_factory = sqlite3.Row
+    try:
+        base = _base(conn, estimate_id)
+        rows = conn.execute('''
+            SELECT revision, parent_revision, is_snapshot, fields, note, created_at
+            FROM cost_estimate_revisions WHERE estimate_id = ? ORDER BY revision
+        ''', (estimate_id,)).fetchall()
+    finally:
+        conn.close()
+
+    # One pass: a parent always has a lower revision number than its child
+    states = {0: _state(base)}
+    entries = [{
+        "revision": 0, "parent_revision": None, "created_at": base["created_at"],
+        "note": "original estimate", "is_snapshot": True, "stored_bytes": 0, "changes": {},
+    }]
+    for row in rows:
+        if row["revision"] == 0:
+            # Frozen when first revised; the live row may have been re-priced since
+            states[0] = _from_snapshot(json.loads(row["fields"]))
+            entries[0].update(created_at=row["created_at"], stored_bytes=len(row["fields"]))
+            continue
+        parent = states[row["parent_revision"]]
+        fields = json.loads(row["fields"])
+        if row["is_snapshot"]:
+            state = _from_snapshot(fields)
+        else:
+            state = apply(parent, fields)
+        states[row["revision"]] = state
+        entries.append({
+            "revision": row["revision"],
+            "parent_revision": row["parent_revision"],
+            "created_at": row["created_at"],
+            "note": row["note"],
+            "is_snapshot": bool(row["is_snapshot"]),
+            "stored_bytes": len(row["fields"]),
+            "changes": {name: (parent[name], state[name]) for name in _CONTENT
+                        if state[name] != parent[name]},
+        })
+    return entries
+
+
+def format_history(estimate_id: int) -> str:
+    """
+    The revision history as text, one block of field changes per revision.
+    """
+    lines = [f"Estimate #{estimate_id}"]
+    for entry in history(estimate_id):
+        head = f"Revision {entry['revision']}"
+        if entry["parent_revision"] is not None:
+            head += f" (from {entry['parent_revision']})"
+        head += f"  {entry['created_at'] or '-'}"
+        if entry["note"]:
+            head += f"  {entry['note']}"
+        lines.append("")
+        lines.append(head)
+        for name, (old, new) in entry["changes"].items():
+            if name == "card_calc_details":
+                lines.append("    card_calc_details: (recalculated)")
+            else:
+                lines.append(f"    {name}: {old} -> {new}")
+        if entry["revision"] and not entry["changes"]:
+            lines.append("    (no changes)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the revision history of an estimate.")
+    parser.add_argument("estimate_id", type=int)
+    parser.add_argument("--revision", type=int, help="print this revision in full")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    if args.revision is None:
+        print(format_history(args.estimate_id))
+    else:
+        q = get_revision(args.estimate_id, args.revision)
+        for name in FIELDS:
+            print(f"{name}: {q[name]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+# validation.py
+"""
+Parsing and validation of quote inputs.
+
+One schema describes every input field. A whole batch of raw values (form
+strings, CSV cells) is checked column by column with NumPy, and every
+problem is reported at once as (row, field, message). A single quote from
+the form is validated as a batch of one, so the GUI and bulk imports apply
+the same rules.
+
+Usage:
+    python validation.py quotes.csv           # report every bad row of a CSV import
+    python validation.py quotes.csv --import  # and save the rows if there are none
+"""
+import argparse
+import csv
+import math
+import sys
+
+import numpy as np
+
+import costing
+import database
+import writer
+from quote import QuoteBatch
+
+COST_TYPES = ("per_piece", "per_order")
+COATINGS = ("None", "UV Coating", "Lamination")
+
+# Whole numbers are checked as float64, exact only up to 2**53, so the
+# bound sits below that (and far inside SQLite's 64-bit INTEGER)
+MAX_WHOLE = 10 ** 15
+# QuoteBatch keeps colour counts as int16
+MAX_COLORS = 2 ** 15 - 1
+
+# Numeric inputs: field, label, type, must be > 0 (else >= 0), Card & Board
+# only, maximum (None for no limit). A blank value counts as 0, as on the form.
+NUMBER_FIELDS = (
+    ("quantity", "Quantity", int, False, False, MAX_WHOLE),
+    ("artwork_cost", "Artwork cost", float, False, False, None),
+    ("width", "Width", float, False, False, None),
+    ("length", "Length", float, False, False, None),
+
+    ("sheet_w", "Sheet W", float, False, True, None),
+    ("sheet_l", "Sheet L", float, False, True, None),
+    ("gsm", "GSM", float, False, True, None),
+    ("gen", "Gen", float, True, True, None),
+    ("kg_price", "Kg price", float, False, True, None),
+    ("freight", "Freight", float, False, True, None),
+    ("sheet_pkt", "Sheet/pkt", float, True, True, None),
+    ("prod_w", "Product W", float, False, True, None),
+    ("prod_l", "Product L", float, False, True, None),
+    ("card_qty", "Card qty", float, False, True, None),
+
+    ("front_colors", "Front colors", int, False, False, MAX_COLORS),
+    ("back_colors", "Back colors", int, False, False, MAX_COLORS),
+    ("printing_color_cost", "Printing color cost", float, False, False, None),
+    ("foil_cost", "Foil cost", float, False, False, None),
+    ("screen_cost", "Screen cost", float, False, False, None),
+    ("heat_cost", "Heat cost", float, False, False, None),
+    ("emboss_cost", "Emboss cost", float, False, False, None),
+    ("coating_cost", "Coating cost", float, False, False, None),
+    ("cutting_cost", "Cutting cost", float, False, False, None),
+)
+
+# Inputs with a fixed set of values: field, label, allowed values (the
+# first is used when blank)
+CHOICE_FIELDS = (
+    ("coating", "Coating", COATINGS),
+    *((type_field, type_field.replace("_", " ").capitalize(), COST_TYPES)
+      for _, type_field in costing.ADD_ON_COSTS),
+)
+
+TEXT_FIELDS = ("client_name", "category", "subcategory", "material")
+
+INPUT_FIELDS = TEXT_FIELDS + tuple(f[0] for f in NUMBER_FIELDS) + tuple(f[0] for f in CHOICE_FIELDS)
+
+
+class ValidationError(ValueError):
+    """
+    Raised with every problem found; `errors` is a list of (row, field, message).
+    """
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("\n".join(message for _, _, message in errors))
+
+
+def _text_column(values, n: int) -> np.ndarray:
+    if values is None:
+        return np.full(n, "", dtype=object)
+    col = np.array(["" if v is None else str(v).strip() for v in values], dtype=object)
+    if len(col) != n:
+        raise ValueError(f"Expected {n} values, got {len(col)}.")
+    return col
+
+
+def _parse_numbers(col: np.ndarray, kind):
+    """
+    Parse a column of strings; blanks become 0. Returns the values (NaN
+    where a cell doesn't parse) and the rows that didn't parse.
+    """
+    col = np.where(col == "", "0", col)
+    dtype = np.int64 if kind is int else np.float64
+    try:
+        return np.array(col, dtype=dtype).astype(np.float64), []
+    except (ValueError, OverflowError):
+        pass
+    # Some cell is bad: find which, one at a time
+    out = np.empty(len(col), dtype=np.float64)
+    bad = []
+    for i, text in enumerate(col.tolist()):
+        try:
+            value = kind(text)
+        except (ValueError, OverflowError):
+            out[i] = math.nan
+            bad.append(i)
+            continue
+        # A whole number past int64 is kept (clamped) for the maximum check to report
+        out[i] = max(-2.0 ** 64, min(value, 2.0 ** 64)) if kind is int else value
+    return out, bad
+
+
+def validate_columns(columns: dict, n: int = None):
+    """
+    Parse and check raw input columns ({field: sequence of values}, missing
+    fields are blank). Returns (parsed, errors): parsed maps every field in
+    INPUT_FIELDS to a NumPy array (float64 for numbers, with NaN for bad
+    cells and for Card & Board inputs of other materials; object for text),
+    errors is a list of (row, field, message) sorted by row.
+    """
+    if n is None:
+        n = len(next(iter(columns.values()))) if columns else 0
+    errors = []
+    parsed = {}
+
+    for name in TEXT_FIELDS:
+        parsed[name] = _text_column(columns.get(name), n)
+    is_card = parsed["material"] == "Card & Board"
+
+    for name, label, kind, positive, card_only, maximum in NUMBER_FIELDS:
+        raw = _text_column(columns.get(name), n)
+        values, bad_rows = _parse_numbers(raw, kind)
+        # Card & Board inputs are ignored for other materials, like the hidden form fields
+        checked = is_card.copy() if card_only else np.ones(n, dtype=bool)
+
+        noun = "a whole number" if kind is int else "a number"
+        for row in bad_rows:
+            if checked[row]:
+                errors.append((row, name, f"{label} must be {noun} (got '{raw[row]}')."))
+        checked[bad_rows] = False
+
+        finite = np.isfinite(values)
+        for row in np.flatnonzero(checked & ~finite).tolist():
+            errors.append((row, name, f"{label} must be a finite number (got '{raw[row]}')."))
+        checked &= finite
+
+        if positive:
+            bad = checked & (values <= 0)
+            message = f"{label} must be greater than 0"
+        else:
+            bad = checked & (values < 0)
+            message = f"{label} cannot be negative"
+        for row in np.flatnonzero(bad).tolist():
+            errors.append((row, name, f"{message} (got {raw[row] or 0})."))
+        if maximum is not None:
+            for row in np.flatnonzero(checked & (values > maximum)).tolist():
+                errors.append((row, name, f"{label} must be at most {maximum:,} (got {raw[row]})."))
+
+        if card_only:
+            values = np.where(is_card, values, np.nan)
+        parsed[name] = values
+
+    for name, label, allowed in CHOICE_FIELDS:
+        col = _text_column(columns.get(name), n)
+        col = np.where(col == "", allowed[0], col)
+        for row in np.flatnonzero(~np.isin(col, allowed)).tolist():
+            errors.append((row, name, f"{label} must be one of {', '.join(allowed)} (got '{col[row]}')."))
+        parsed[name] = col
+
+    errors.sort(key=lambda e: e[0])
+    return parsed, errors
+
+
+def parse_quote(raw: dict) -> dict:
+    """
+    Parse one quote's raw inputs ({field: string}) into Python values:
+    int/float for numbers, None for Card & Board inputs of other materials.
+    Raises ValidationError listing every problem.
+    """
+    parsed, errors = validate_columns({name: [value] for name, value in raw.items()}, 1)
+    if errors:
+        raise ValidationError(errors)
+    values = {}
+    for name in TEXT_FIELDS + tuple(f[0] for f in CHOICE_FIELDS):
+        values[name] = parsed[name][0]
+    for name, _, kind, _, _, _ in NUMBER_FIELDS:
+        v = parsed[name][0]
+        values[name] = None if math.isnan(v) else kind(v)
+    return values
+
+
+def _read_csv(path: str):
+    with open(path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        # Short rows are padded with blanks; extra cells are dropped
+        rows = [(row + [""] * len(header))[:len(header)] for row in reader]
+    unknown = [h for h in header if h not in INPUT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    columns = {name: col for name, col in zip(header, zip(*rows))} if rows else {}
+    return columns, len(rows)
+
+
+def _csv_errors(errors):
+    # Line 1 is the header
+    return [(row + 2, field, message) for row, field, message in errors]
+
+
+def validate_csv(path: str):
+    """
+    Validate a CSV of quotes with a header row of field names.
+    Returns (rows read, errors) with rows numbered as CSV lines.
+    """
+    columns, n = _read_csv(path)
+    _, errors = validate_columns(columns, n)
+    return n, _csv_errors(errors)
+
+
+def import_csv(path: str):
+    """
+    Validate a CSV of quotes and, if every row passes, price them as
+    calculate_cost does and save them all in one transaction.
+    Returns (rows read, errors, rows saved); nothing is saved if there
+    are errors.
+    """
+    columns, n = _read_csv(path)
+    parsed, errors = validate_columns(columns, n)
+    if errors or not n:
+        return n, _csv_errors(errors), 0
+
+    # As on the form, gsm is 0 for materials other than Card & Board
+    parsed["gsm"] = np.nan_to_num(parsed["gsm"])
+    batch = QuoteBatch(n)
+    batch.add_columns(parsed, n)
+    batch.compute_card_rates()
+    batch.compute_totals()
+    return n, [], writer.save_cost_estimates(batch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check a CSV of quotes, and optionally import it.")
+    parser.add_argument("csv_file")
+    parser.add_argument("--import", dest="do_import", action="store_true",
+                        help="save every row if the whole file is valid")
+    args = parser.parse_args(argv)
+
+    if args.do_import:
+        database.init_db()
+        count, errors, saved = import_csv(args.csv_file)
+    else:
+        count, errors = validate_csv(args.csv_file)
+    for line, _, message in errors:
+        print(f"line {line}: {message}")
+    bad_rows = len({line for line, _, _ in errors})
+    print(f"{count} rows, {bad_rows} with errors, {len(errors)} errors.")
+    if args.do_import:
+        print(f"Imported {saved} estimates." if saved else "Nothing imported.")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
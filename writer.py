@@ -0,0 +1,350 @@
+# writer.py
+"""
+Single-writer commit queue.
+
+All inserts and updates from a process go through one writer thread that
+owns the only write connection. It drains whatever has queued up and
+commits it as one transaction (group commit), so many callers share one
+fsync and one lock acquisition instead of fighting over the database.
+A group that finds the database busy (another process writing) is rolled
+back and retried until RETRY_FOR seconds have passed.
+
+The app and the batch jobs write through the process's shared queue:
+
+    new_id = writer.save_cost_estimate(quote)
+    writer.transaction(lambda conn: conn.execute(...))  # inside a group
+    writer.run_job(fn)  # alone, outside a transaction (ATTACH, own batches)
+
+Readers should use database.get_read_connection() (WAL, never blocks the writer).
+
+Run `python writer.py --stress` to compare direct per-row commits against the
+queue with several writer processes, each with several concurrent callers.
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from multiprocessing import Pool
+
+import database
+
+MAX_BATCH = 500
+# Seconds a busy group or BEGIN IMMEDIATE is retried before its callers get the error
+RETRY_FOR = 60.0
+
+_STOP = object()
+_SQL, _CALL, _RUN = "sql", "call", "run"
+
+
+def _is_busy(e: sqlite3.Error) -> bool:
+    text = str(e)
+    return isinstance(e, sqlite3.OperationalError) and ("locked" in text or "busy" in text)
+
+
+def begin(conn, retry_for: float = RETRY_FOR):
+    """
+    BEGIN IMMEDIATE on a connection with isolation_level=None, retrying with
+    backoff while another process holds the write lock.
+    """
+    deadline = time.monotonic() + retry_for
+    delay = 0.01
+    while True:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            return
+        except sqlite3.OperationalError as e:
+            if not _is_busy(e) or time.monotonic() > deadline:
+                raise
+        time.sleep(delay)
+        delay = min(delay * 2, 0.5)
+
+
+class CommitQueue:
+    """
+    Owns a writer thread and its connection. submit() and call() are
+    committed in groups; each returns a Future that resolves once its group
+    has committed.
+    """
+    def __init__(self, max_batch: int = MAX_BATCH):
+        self.max_batch = max_batch
+        self.db_name = database.DB_NAME
+        self.pid = os.getpid()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, sql: str, params=()) -> Future:
+        """
+        Queue one statement; the Future resolves to its lastrowid.
+        """
+        fut = Future()
+        self._queue.put((_SQL, (sql, params), fut))
+        return fut
+
+    def call(self, fn) -> Future:
+        """
+        Queue fn(conn) to run inside a group's transaction; the Future
+        resolves to its return value. fn runs again if its group is retried,
+        so it should only work through conn.
+        """
+        fut = Future()
+        self._queue.put((_CALL, fn, fut))
+        return fut
+
+    def run(self, fn) -> Future:
+        """
+        Queue fn(conn) to run alone, between groups and outside any
+        transaction, for work that ATTACHes databases or commits in its own
+        batches (see begin()). The connection has isolation_level=None.
+        """
+        fut = Future()
+        self._queue.put((_RUN, fn, fut))
+        return fut
+
+    def save_cost_estimate(self, data) -> Future:
+        return self.submit(database.INSERT_ESTIMATE_SQL, database.estimate_params(data))
+
+    def close(self):
+        """
+        Commit everything still queued, then stop the writer thread.
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _run(self):
+        # isolation_level=None: transactions are managed explicitly below
+        conn = database.get_connection()
+        conn.isolation_level = None
+        conn.row_factory = sqlite3.Row
+        try:
+            stopping = False
+            while not stopping:
+                batch = [self._queue.get()]
+                # Take everything that piled up while the last group was committing
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                group = []
+                for item in batch:
+                    if item is _STOP:
+                        stopping = True
+                    elif item[0] == _RUN:
+                        # Jobs keep their place in line with the writes around them
+                        self._commit_group(conn, group)
+                        group = []
+                        self._run_job(conn, item[1], item[2])
+                    else:
+                        group.append(item)
+                self._commit_group(conn, group)
+        finally:
+            conn.close()
+
+    def _run_job(self, conn, fn, fut):
+        try:
+            result = fn(conn)
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            fut.set_exception(e)
+        else:
+            fut.set_result(result)
+
+    def _commit_group(self, conn, group):
+        if not group:
+            return
+        deadline = time.monotonic() + RETRY_FOR
+        delay = 0.01
+        while True:
+            try:
+                results = self._try_group(conn, group)
+                break
+            except sqlite3.Error as e:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                if not _is_busy(e) or time.monotonic() > deadline:
+                    for _, _, fut in group:
+                        fut.set_exception(e)
+                    return
+            time.sleep(delay)
+            delay = min(delay * 2, 0.5)
+
+        for fut, value, err in results:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(value)
+
+    def _try_group(self, conn, group) -> list:
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        for kind, payload, fut in group:
+            # A savepoint per item, so one bad row doesn't sink its group
+            conn.execute("SAVEPOINT item")
+            try:
+                if kind == _SQL:
+                    value = conn.execute(*payload).lastrowid
+                else:
+                    value = payload(conn)
+                conn.execute("RELEASE item")
+                results.append((fut, value, None))
+            except Exception as e:
+                if _is_busy(e):
+                    raise
+                conn.execute("ROLLBACK TO item")
+                conn.execute("RELEASE item")
+                results.append((fut, None, e))
+        conn.execute("COMMIT")
+        return results
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_queue() -> CommitQueue:
+    """
+    This process's CommitQueue, started on first use (and again after a
+    fork or a change of database.DB_NAME).
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None or _shared.pid != os.getpid() or _shared.db_name != database.DB_NAME:
+            if _shared is not None and _shared.pid == os.getpid():
+                _shared.close()
+            _shared = CommitQueue()
+        return _shared
+
+
+def save_cost_estimate(data) -> int:
+    """
+    database.save_cost_estimate through the shared queue. Returns the new ID.
+    """
+    return shared_queue().save_cost_estimate(data).result()
+
+
+def save_cost_estimates(batch) -> int:
+    """
+    Insert every quote of a quote.QuoteBatch in one transaction through the
+    shared queue. Returns the number of rows inserted.
+    """
+    # iter_params() inside fn, so a retried group starts the rows over
+    return transaction(lambda conn: conn.executemany(database.INSERT_ESTIMATE_SQL, batch.iter_params()).rowcount)
+
+
+def transaction(fn):
+    """
+    Run fn(conn) in a write transaction on the shared queue and return its
+    result (or raise its exception). Don't call writer functions from fn.
+    """
+    return shared_queue().call(fn).result()
+
+
+def run_job(fn):
+    """
+    Run fn(conn) alone on the shared queue's connection, outside any
+    transaction, and return its result. Don't call writer functions from fn.
+    """
+    return shared_queue().run(fn).result()
+
+
+# ---------------- Stress test ----------------
+
+def _sample_estimate(i: int) -> dict:
+    return {
+        "client_name": f"Client {i % 100}",
+        "category": "Hang tags",
+        "subcategory": "Size tag",
+        "quantity": 1000,
+        "artwork_cost": 500.0, "artwork_cost_type": "per_order",
+        "width": 2.0, "length": 3.0, "material": "Paper", "gsm": 0.0,
+        "card_calc_cost_per_piece": 0.0, "card_calc_details": "",
+        "front_colors": 1, "back_colors": 0,
+        "printing_color_cost": 0.5, "printing_color_cost_type": "per_piece",
+        "foil_cost": 0.0, "foil_cost_type": "per_piece",
+        "screen_cost": 0.0, "screen_cost_type": "per_piece",
+        "heat_cost": 0.0, "heat_cost_type": "per_piece",
+        "emboss_cost": 0.0, "emboss_cost_type": "per_piece",
+        "coating": "None", "coating_cost": 0.0, "coating_cost_type": "per_piece",
+        "cutting_cost": 0.0, "cutting_cost_type": "per_piece",
+        "total_cost_per_piece": 0.5, "total_cost_order": 1000.0,
+    }
+
+
+def _stress_worker(args):
+    db_name, mode, callers, rows, busy_timeout = args
+    database.DB_NAME = db_name
+    database.BUSY_TIMEOUT = busy_timeout
+    save = database.save_cost_estimate if mode == "direct" else save_cost_estimate
+
+    # Each caller saves its rows one at a time and waits for each, as the app does
+    def caller(c):
+        lost = 0
+        for i in range(c, rows, callers):
+            try:
+                save(_sample_estimate(i))
+            except sqlite3.OperationalError as e:
+                if not _is_busy(e):
+                    raise
+                lost += 1
+        return lost
+
+    with ThreadPoolExecutor(callers) as pool:
+        return sum(pool.map(caller, range(callers)))
+
+
+def _count_rows(db_name: str) -> int:
+    conn = sqlite3.connect(db_name)
+    count = conn.execute("SELECT COUNT(*) FROM cost_estimates").fetchone()[0]
+    conn.close()
+    return count
+
+
+def stress(db_name: str, procs: int, callers: int, rows: int, busy_timeout: float):
+    """
+    Run `procs` writer processes with `callers` threads each, `rows` inserts
+    per process, first committing every row directly and then through each
+    process's shared CommitQueue. Rows written are counted in the database.
+    """
+    database.DB_NAME = db_name
+    database.init_db()
+
+    for mode in ("direct", "queued"):
+        before = _count_rows(db_name)
+        start = time.perf_counter()
+        with Pool(procs) as pool:
+            errors = sum(pool.map(_stress_worker, [(db_name, mode, callers, rows, busy_timeout)] * procs))
+        elapsed = time.perf_counter() - start
+        written = _count_rows(db_name) - before
+        print(f"{mode:>7}: {written} of {procs * rows} rows in {elapsed:.2f}s "
+              f"({written / elapsed:,.0f} rows/s), lost to lock errors: {errors}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Commit-queue stress test.")
+    parser.add_argument("--stress", action="store_true", required=True)
+    parser.add_argument("--db", default="stress_test.db", help="scratch database (deleted first)")
+    parser.add_argument("--procs", type=int, default=8)
+    parser.add_argument("--callers", type=int, default=4, help="concurrent saving threads per process")
+    parser.add_argument("--rows", type=int, default=500, help="inserts per process")
+    parser.add_argument("--busy-timeout", type=float, default=database.BUSY_TIMEOUT)
+    args = parser.parse_args(argv)
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    stress(args.db, args.procs, args.callers, args.rows, args.busy_timeout)
+
+
+if __name__ == "__main__":
+    main()